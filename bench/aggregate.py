@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# Times the daily forecast summary: the nested dict loops the widget used to run
+# in the_loop against weather.aggregate, per location and as one batch call over
+# N locations x 40 points.
+#
+# Usage: python3 bench/aggregate.py [--locations 50] [--runs 20]
+
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, os.pardir))
+
+from weather import aggregate  # noqa: E402
+from timing import header, row, timed  # noqa: E402
+
+
+def old_loop(forecast):
+    """ The summary as the_loop used to work it out, unit conversion left out """
+    wt2 = []
+    for data in forecast['list']:
+        dt = datetime.utcfromtimestamp(data['dt'] + forecast['city']['timezone'])
+        try:
+            rain = data['rain']['3h']
+        except KeyError:
+            rain = 0
+        wt2.append({'t': round(data['main']['temp']), 'day': dt.strftime('%a'), 'date': dt.strftime('%d.%m'),
+                    'time': dt.strftime('%H:%M'), 'icon': data['weather'][0]['icon'],
+                    'text': data['weather'][0]['description'], 'wind_speed': round(data['wind']['speed']),
+                    'wind_direct': data['wind']['deg'], 'wind_gust': round(data['wind']['gust']),
+                    'rain': rain, 'pop': data['pop'], 'pres': data['main']['pressure']})
+    wt = [[]]
+    i = 0
+    _date = dt.strftime('%d')
+    for item in wt2:
+        if _date != item['date']:
+            i += 1
+            wt.append([])
+            _date = item['date']
+        wt[i].append(item)
+    out = []
+    for i in range(1, len(wt)):
+        max_t = min_t = g = max_pop = None
+        w_s = r = p = 0
+        for item in wt[i]:
+            if max_t is None:
+                max_t = min_t = item['t']
+            elif item['t'] > max_t:
+                max_t = item['t']
+            elif item['t'] < min_t:
+                min_t = item['t']
+            w_s += item['wind_speed']
+            p += item['pres']
+            r += item['rain']
+            if max_pop is None or item['pop'] > max_pop:
+                max_pop = item['pop']
+            if g is None or int(item['wind_gust']) > int(g):
+                g = item['wind_gust']
+        out.append((max_t, min_t, w_s / len(wt[i]), g, r, max_pop, p / len(wt[i])))
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--locations', type=int, default=50)
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    with open(os.path.join(HERE, 'fixtures', 'forecast.json')) as f:
+        forecast = json.load(f)
+    forecasts = [forecast] * args.locations
+
+    # Same days and the same maxima as the old loop
+    days = aggregate.daily(aggregate.Columns().add_forecast(forecast), use_numpy=False)
+    assert [round(t) for t in days.max_temp] == [d[0] for d in old_loop(forecast)]
+
+    print('%d locations x %d points, %d runs' % (args.locations, len(forecast['list']), args.runs))
+    print(header())
+    print(row('old nested loops', timed(lambda: [old_loop(f) for f in forecasts], args.runs)))
+    columns = aggregate.Columns.from_forecasts(forecasts)
+    print(row('columns from JSON', timed(lambda: aggregate.Columns.from_forecasts(forecasts), args.runs)))
+    print(row('daily, pure python batch', timed(lambda: aggregate.daily(columns, use_numpy=False), args.runs)))
+    if aggregate.have_numpy():
+        print(row('daily, numpy batch', timed(lambda: aggregate.daily(columns, use_numpy=True), args.runs)))
+
+
+if __name__ == '__main__':
+    main()
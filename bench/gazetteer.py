@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# Build time and lookup time of the offline gazetteer, on a synthetic GeoNames
+# style dump of N places with random names, or on a real dump given with --dump.
+#
+# Usage: python3 bench/gazetteer.py [--places 200000] [--lookups 2000] [--dump cities15000.txt]
+
+import argparse
+import os
+import random
+import shutil
+import string
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, os.pardir))
+
+from weather.gazetteer import Gazetteer  # noqa: E402
+from timing import header, row, timed  # noqa: E402
+
+
+def write_dump(path, count):
+    rng = random.Random(1)
+    names = []
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(count):
+            name = rng.choice(string.ascii_uppercase) + ''.join(rng.choice(string.ascii_lowercase)
+                                                                for _ in range(rng.randint(3, 11)))
+            names.append(name)
+            f.write('\t'.join([str(i), name, name, '', '%.5f' % rng.uniform(-90, 90), '%.5f' % rng.uniform(-180, 180),
+                               'P', 'PPL', rng.choice(['GB', 'FR', 'US', 'DE']), '', '', '', '', '',
+                               str(rng.randint(0, 1000000)), '', '0', 'Europe/London', '2020-01-01']) + '\n')
+    return names
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--places', type=int, default=200000)
+    parser.add_argument('--lookups', type=int, default=2000)
+    parser.add_argument('--dump')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    dump = args.dump or os.path.join(directory, 'gazetteer.txt')
+    if args.dump:
+        with open(dump, encoding='utf-8') as f:
+            names = [line.split('\t')[1] for line in f]
+    else:
+        names = write_dump(dump, args.places)
+    gazetteer = Gazetteer(dump, os.path.join(directory, 'gazetteer.idx'))
+
+    start = time.perf_counter()
+    gazetteer.open()
+    print('%d places, index built and mapped in %.0f ms, %.1f MiB'
+          % (len(names), (time.perf_counter() - start) * 1000,
+             os.path.getsize(gazetteer.index) / 1024 / 1024))
+
+    rng = random.Random(2)
+    print(header())
+    for label, length in (('full name', None), ('4 letter prefix', 4), ('1 letter prefix', 1)):
+        queries = [name if length is None else name[:length] for name in rng.sample(names, args.lookups)]
+        queries = iter(queries)
+        print(row(label, timed(lambda: gazetteer.search(next(queries)), args.lookups)))
+    shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
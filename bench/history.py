@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# Cost of the observation history: a year of 15 minute observations for one place
+# written one refresh at a time, as the widget does (thinning to hourly as it goes),
+# then the range queries a sparkline or the pressure tendency would make.
+#
+# Usage: python3 bench/history.py [--days 365] [--interval 900] [--queries 500]
+
+import argparse
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, os.pardir))
+
+from weather.history import DAY, HOUR, History  # noqa: E402
+from timing import header, row, timed  # noqa: E402
+
+LAT, LON = '51.5', '0.0'
+
+
+def observation(rng, dt):
+    day = math.sin(dt / DAY * 2 * math.pi)
+    year = math.sin(dt / (365 * DAY) * 2 * math.pi)
+    return SimpleNamespace(dt=dt, temp=10 + 8 * year + 4 * day + rng.gauss(0, 1), feels_like=8 + 8 * year + 4 * day,
+                           pressure=1013 + rng.randint(-20, 20), humidity=rng.randint(40, 100),
+                           clouds=rng.randint(0, 100), wind_speed=abs(rng.gauss(4, 3)),
+                           wind_gust=abs(rng.gauss(8, 4)) if rng.random() < 0.7 else None,
+                           wind_deg=rng.randint(0, 360))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--interval', type=int, default=900, help='seconds between observations')
+    parser.add_argument('--queries', type=int, default=500)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'history.db')
+    history = History(path)
+    rng = random.Random(1)
+    end = 1700000000
+    start = end - args.days * DAY
+
+    inserts = []
+    prunes = []
+    for dt in range(start, end, args.interval):
+        cc = observation(rng, dt)
+        pruning = dt - history.pruned >= HOUR
+        began = time.perf_counter()
+        history.add(LAT, LON, cc, now=dt)
+        (prunes if pruning else inserts).append(time.perf_counter() - began)
+    history.db.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    rows = history.db.execute('SELECT count(*) FROM observations').fetchone()[0]
+    print('%d observations written, %d kept after thinning, %.0f KiB on disk'
+          % (len(inserts) + len(prunes), rows, os.path.getsize(path) / 1024))
+    print(header())
+    print(row('add', inserts))
+    print(row('add, hourly prune', prunes))
+
+    queries = [
+        ('last 24 h, every point', lambda: history.series(LAT, LON, 'temp', end - DAY, end)),
+        ('last 7 days, 48 points', lambda: history.series(LAT, LON, 'temp', end - 7 * DAY, end, 48)),
+        ('last 30 days, 60 points', lambda: history.series(LAT, LON, 'pressure', end - 30 * DAY, end, 60)),
+        ('whole year, 100 points', lambda: history.series(LAT, LON, 'temp', start, end, 100)),
+        ('pressure tendency', lambda: history.tendency(LAT, LON)),
+    ]
+    for label, query in queries:
+        print(row(label, timed(query, args.queries)))
+
+    history.close()
+    shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# Unit conversion, compass points and colour bands over 40 x N forecast points:
+# the old if-ladders one value at a time, the table-driven functions one value
+# at a time with the converter picked once, and the whole-column versions.
+#
+# Usage: python3 bench/kernels.py [--locations 50] [--runs 20]
+
+import argparse
+import json
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, os.pardir))
+
+from weather import aggregate, theme, units  # noqa: E402
+from timing import header, row, timed  # noqa: E402
+
+
+def old_wind_speed(wndspd, unit):
+    if unit == 'm/s':
+        pass
+    elif unit == 'kph':
+        wndspd = wndspd * 3.6
+    elif unit == 'mph':
+        wndspd = wndspd * 2.23694
+    elif unit == 'kt':
+        wndspd = wndspd * 1.944
+    elif unit == 'Bf':
+        wndspd = (float(wndspd) / 0.836) ** (2 / 3)
+    return wndspd
+
+
+def old_temperature(t, unit):
+    if unit == 'F':
+        return (t * 1.8) + 32
+    return t
+
+
+def old_bearing(wnd_dir):
+    if wnd_dir <= 11:
+        wnd_dir = 'N'
+    elif wnd_dir > 11 and wnd_dir <= 33:
+        wnd_dir = 'NNE'
+    elif wnd_dir > 33 and wnd_dir <= 56:
+        wnd_dir = 'NE'
+    elif wnd_dir > 56 and wnd_dir <= 78:
+        wnd_dir = 'ENE'
+    elif wnd_dir > 78 and wnd_dir <= 101:
+        wnd_dir = 'E'
+    elif wnd_dir > 101 and wnd_dir <= 123:
+        wnd_dir = 'ESE'
+    elif wnd_dir > 123 and wnd_dir <= 146:
+        wnd_dir = 'SE'
+    elif wnd_dir > 146 and wnd_dir <= 168:
+        wnd_dir = 'SSE'
+    elif wnd_dir > 168 and wnd_dir <= 190:
+        wnd_dir = 'S'
+    elif wnd_dir > 190 and wnd_dir <= 213:
+        wnd_dir = 'SSW'
+    elif wnd_dir > 213 and wnd_dir <= 235:
+        wnd_dir = 'SW'
+    elif wnd_dir > 235 and wnd_dir <= 258:
+        wnd_dir = 'WSW'
+    elif wnd_dir > 258 and wnd_dir <= 280:
+        wnd_dir = 'W'
+    elif wnd_dir > 280 and wnd_dir <= 303:
+        wnd_dir = 'WNW'
+    elif wnd_dir > 303 and wnd_dir <= 325:
+        wnd_dir = 'NW'
+    elif wnd_dir > 325 and wnd_dir <= 347:
+        wnd_dir = 'NNW'
+    elif wnd_dir > 347 and wnd_dir <= 360:
+        wnd_dir = 'N'
+    return wnd_dir
+
+
+def old_temp_colour(temp):
+    if temp <= 0:
+        temp_colour = '#00ffff'
+    elif temp > 0 and temp < 5:
+        temp_colour = '#3399ff'
+    elif temp >= 5 and temp < 10:
+        temp_colour = '#3366cc'
+    elif temp >= 10 and temp < 15:
+        temp_colour = '#3319FF'
+    elif temp >= 15 and temp < 20:
+        temp_colour = '#ff3300'
+    elif temp >= 20 and temp < 25:
+        temp_colour = '#ff0000'
+    elif temp >= 25:
+        temp_colour = '#993300'
+    return temp_colour
+
+
+def old_wind_colour(wnd_spd):
+    if wnd_spd < 8:
+        wnd_colour = '#2E423B'
+    if wnd_spd >= 8 and wnd_spd < 15:
+        wnd_colour = '#CE5C00'
+    elif wnd_spd >= 15 and wnd_spd < 20:
+        wnd_colour = '#CE1600'
+    elif wnd_spd >= 20 and wnd_spd < 25:
+        wnd_colour = '#CC0000'
+    elif wnd_spd >= 25:
+        wnd_colour = '#A40075'
+    return wnd_colour
+
+
+def old(temp, wind, deg, temp_unit, speed_unit):
+    return ([old_temperature(t, temp_unit) for t in temp], [old_wind_speed(w, speed_unit) for w in wind],
+            [old_bearing(d) for d in deg], [old_temp_colour(t) for t in temp], [old_wind_colour(w) for w in wind])
+
+
+def per_value(temp, wind, deg, temp_unit, speed_unit):
+    to_temp = units.temperature_converter(temp_unit)
+    to_speed = units.speed_converter(speed_unit)
+    palette = theme.DEFAULT
+    return ([to_temp(t) for t in temp], [to_speed(w) for w in wind], [units.bearing(d) for d in deg],
+            [palette.temp(t) for t in temp], [palette.wind(w) for w in wind])
+
+
+def columns(temp, wind, deg, temp_unit, speed_unit):
+    palette = theme.DEFAULT
+    return (units.temperature_column(temp, temp_unit), units.speed_column(wind, speed_unit), units.bearing_column(deg),
+            palette.temp.column(temp), palette.wind.column(wind))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--locations', type=int, default=50)
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    with open(os.path.join(HERE, 'fixtures', 'forecast.json')) as f:
+        forecast = json.load(f)
+    c = aggregate.Columns.from_forecasts([forecast] * args.locations)
+    deg = [item['wind']['deg'] for item in forecast['list']] * args.locations
+
+    # Same answers every way
+    for temp_unit, speed_unit in (('C', 'mph'), ('F', 'Bf'), ('C', 'kt')):
+        results = [list(map(list, fn(c.temp, c.wind_speed, deg, temp_unit, speed_unit))) for fn in (old, per_value, columns)]
+        assert results[0] == results[1] == results[2]
+
+    print('%d locations x 40 points = %d, %d runs, F and mph' % (args.locations, len(c), args.runs))
+    print(header())
+    for name, fn in (('old if-ladders', old), ('tables, per value', per_value), ('tables, columns', columns)):
+        print(row(name, timed(lambda: fn(c.temp, c.wind_speed, deg, 'F', 'mph'), args.runs)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# Refresh time and memory as the number of places grows, fetching through
+# weather.fetch.fetch_many against bench/stub_server.py.
+# Each run starts with an empty response cache so every place hits the server.
+#
+# Usage: python3 bench/locations.py [--latency 0.05] [--fail-rate 0] [--workers 4] [--counts 1,5,10,25,50]
+
+import argparse
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, os.pardir))
+
+from weather import fetch  # noqa: E402
+from weather.cache import ResponseCache  # noqa: E402
+from weather.transport import Transport  # noqa: E402
+from stub_server import StubServer, add_arguments  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    add_arguments(parser)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--counts', default='1,5,10,25,50')
+    args = parser.parse_args()
+
+    server = StubServer(latency=args.latency, fail_rate=args.fail_rate, fail_status=args.fail_status, seed=1)
+    fetch.API = server.start()
+
+    transport = Transport()
+    pool = ThreadPoolExecutor(max_workers=args.workers)
+    print('%d workers, %.0f ms per request' % (args.workers, args.latency * 1000))
+    print('places  refresh ms  failed  python KiB  max RSS MiB')
+    for count in [int(n) for n in args.counts.split(',')]:
+        directory = tempfile.mkdtemp()
+        cache = ResponseCache(directory, transport, max_bytes=64 * 1024 * 1024)
+        places = [(str(50 + i / 10), str(i / 10)) for i in range(count)]
+        tracemalloc.start()
+        start = time.perf_counter()
+        results = fetch.fetch_many(cache, pool, places, 'bench')
+        seconds = time.perf_counter() - start
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        failed = sum(1 for cc, forecast in results if cc is None or forecast is None)
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print('%6d  %10.0f  %6d  %10.0f  %11.1f' % (count, seconds * 1000, failed, current / 1024, rss))
+        del results
+        shutil.rmtree(directory)
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
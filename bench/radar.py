@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# Radar tiles for a 600 x 600 view with one ring of neighbours, every frame,
+# fetched from bench/stub_server.py through the tile cache: cold with a pool of
+# 1 (one tile at a time) and of --workers, then warm from disk. "screen" is when
+# the tiles on screen of the base map and the latest frame were all in.
+#
+# Usage: python3 bench/radar.py [--latency 0.05] [--workers 4]
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, os.pardir))
+
+from weather import radar  # noqa: E402
+from weather.radar import Radar, TileCache  # noqa: E402
+from weather.transport import Transport  # noqa: E402
+from stub_server import StubServer, add_arguments  # noqa: E402
+
+
+def load(directory, workers, transport):
+    """ (seconds until the screen was complete, seconds until everything was, tiles) """
+    pool = ThreadPoolExecutor(max_workers=workers)
+    view = Radar(TileCache(directory, transport), pool)
+    start = time.perf_counter()
+    frames = view.frames()
+    tiles = radar.view_tiles(51.5, 0.0, view.zoom, 600, 600)
+    urls = view.urls(frames, len(frames) - 1, tiles)
+    screen = {url for url, on_screen in urls[:2 * len(tiles)] if on_screen}
+    lock = threading.Lock()
+    arrived = {}
+
+    def done(url, data):
+        with lock:
+            if url in screen:
+                screen.discard(url)
+                if not screen:
+                    arrived['screen'] = time.perf_counter() - start
+    wait(view.prefetch(urls, threading.Event(), done))
+    total = time.perf_counter() - start
+    pool.shutdown()
+    return arrived.get('screen', total), total, len(urls)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=4)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = StubServer(latency=args.latency, fail_rate=args.fail_rate, fail_status=args.fail_status, seed=1)
+    base = server.start()
+    radar.FRAMES_URL = base + 'radar.json'
+    radar.BASE_URL = base + 'tiles/{z}/{x}/{y}.png'
+    transport = Transport()
+
+    print('%.0f ms latency' % (args.latency * 1000))
+    directory = None
+    for label, workers, fresh in (('cold, 1 at a time', 1, True), ('cold, %d workers' % args.workers, args.workers, True),
+                                  ('warm, from disk', args.workers, False)):
+        if fresh:
+            if directory is not None:
+                shutil.rmtree(directory)
+            directory = tempfile.mkdtemp()
+        screen, total, count = load(directory, workers, transport)
+        print('%-20s %3d tiles   screen %7.1f ms   all %7.1f ms' % (label, count, screen * 1000, total * 1000))
+    shutil.rmtree(directory)
+    transport.close()
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
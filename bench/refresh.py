@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# Compares refresh time with the two OpenWeatherMap requests of each place made
+# one after the other (the old the_loop) against all of them queued at once, as
+# Win.fetch_data does with weather.fetch.fetch_many. Both go through the widget's
+# own Transport and ResponseCache, against bench/stub_server.py, with the cache's
+# TTLs at 0 so every refresh asks the server.
+#
+# Usage: python3 bench/refresh.py [--runs 20] [--places 1] [--latency 0.05] [--fail-rate 0]
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, os.pardir))
+
+from weather import fetch  # noqa: E402
+from weather.cache import ResponseCache  # noqa: E402
+from weather.transport import Transport  # noqa: E402
+from stub_server import StubServer, add_arguments  # noqa: E402
+from timing import header, row, timed  # noqa: E402
+
+
+def sequential(cache, pool, places):
+    """ Each place's current conditions, then its forecast, waiting for every answer """
+    for lat, lon in places:
+        for endpoint in fetch.ENDPOINTS:
+            fetch.collect(fetch.submit(cache, pool, lat, lon, 'bench', endpoints=(endpoint,)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--places', type=int, default=1)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = StubServer(latency=args.latency, fail_rate=args.fail_rate, fail_status=args.fail_status, seed=1)
+    fetch.API = server.start()
+    directory = tempfile.mkdtemp()
+    transport = Transport()
+    cache = ResponseCache(directory, transport)
+    cache.ttl = {'weather': 0, 'forecast': 0}
+    pool = ThreadPoolExecutor(max_workers=4)  # as Win.fetch_pool
+    places = [('%.1f' % (50 + i / 10), '0.0') for i in range(args.places)]
+
+    print('%d places, %.0f ms latency, %d runs' % (args.places, args.latency * 1000, args.runs))
+    print(header(10))
+    for label, fn in (('sequential', lambda: sequential(cache, pool, places)),
+                      ('concurrent', lambda: fetch.fetch_many(cache, pool, places, 'bench'))):
+        print(row(label, timed(fn, args.runs), 10))
+    print('requests: %s' % dict(server.requests))
+
+    pool.shutdown()
+    transport.close()
+    server.shutdown()
+    shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
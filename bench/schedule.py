@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# Requests weather.schedule.Schedule makes in a simulated day, against a fixed
+# timer of the refresh period, for stations that report at different intervals.
+# Each station's observation time moves on every --interval minutes and reaches
+# the API a minute later. "fixed retry" is the schedule with the retry after an
+# unchanged poll kept at a fifth of the period, as it was before it backed off.
+#
+# Usage: python3 bench/schedule.py [--period 15] [--intervals 10,15,20,30,60] [--hours 24]
+
+import argparse
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, os.pardir))
+
+from weather.schedule import Schedule  # noqa: E402
+
+START = 1700000000
+LAG = 60  # seconds from the observation to it being served
+
+
+class FixedRetry(Schedule):
+    def success(self, server_time, now):
+        self.repeats = 0
+        super().success(server_time, now)
+
+
+def simulate(kind, period, interval, hours):
+    """ (requests, unchanged polls, mean age of the data shown in seconds) """
+    def observed(now):
+        return (now - LAG) // interval * interval
+
+    schedule = kind(period, period, START)
+    now, end = START, START + hours * 3600
+    shown = None
+    age = 0
+    while now < end:
+        schedule.fetched(1)
+        server_time = observed(now)
+        schedule.success(server_time, now)
+        shown = server_time
+        due = min(schedule.due, end)
+        age += (due - now) * ((now + due) / 2 - shown)  # the data shown ages until the next poll
+        now = due
+    return schedule.requests, schedule.unchanged, age / (hours * 3600)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--period', type=int, default=15, help='refresh period, minutes')
+    parser.add_argument('--intervals', default='10,15,20,30,60', help='station report intervals, minutes')
+    parser.add_argument('--hours', type=int, default=24)
+    args = parser.parse_args()
+    period = args.period * 60
+    fixed = args.hours * 3600 // period
+
+    print('%d minute period, %d hours, fixed timer %d requests' % (args.period, args.hours, fixed))
+    print('%-10s %-12s %9s %9s %9s' % ('station', 'schedule', 'requests', 'unchanged', 'mean age'))
+    for interval in args.intervals.split(','):
+        for label, kind in (('backoff', Schedule), ('fixed retry', FixedRetry)):
+            requests, unchanged, age = simulate(kind, period, int(interval) * 60, args.hours)
+            print('%-10s %-12s %9d %9d %7.1f m' % (interval + ' min', label, requests, unchanged, age / 60))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# Memory soak: thousands of refreshes against bench/stub_server.py, with the five
+# day window opened and closed, units switched and preferences opened along the
+# way. Resident memory, the number of Python objects and tracemalloc's total are
+# sampled as it goes; after --warmup cycles (caches filling up) they are the
+# baseline, and the run fails if any grows past its budget by the end. The
+# allocation sites that grew most are printed either way.
+#
+#     xvfb-run python3 bench/soak.py [--cycles 3000] [--rss-budget 8] ...
+#
+# --headless runs the same refresh without GTK: fetch, parse, the views the
+# widget would show, the chart layout and the history, for when there is no
+# display or PyGObject.
+
+import argparse
+import gc
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, os.pardir))
+
+from weather import chart, fetch, present, theme  # noqa: E402
+from weather.cache import ResponseCache  # noqa: E402
+from weather.history import History  # noqa: E402
+from weather.transport import Transport  # noqa: E402
+from stub_server import StubServer, add_arguments  # noqa: E402
+from suite import PREFS  # noqa: E402
+
+
+def rss():
+    """ Resident set size in bytes, the peak where /proc isn't there """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def measure():
+    gc.collect()
+    return rss(), len(gc.get_objects()), tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+
+
+class Headless:
+    """ One refresh as the widget does it, minus GTK """
+
+    def __init__(self, directory):
+        self.transport = Transport()
+        self.cache = ResponseCache(directory, self.transport)
+        self.pool = ThreadPoolExecutor(max_workers=4)
+        self.history = History(os.path.join(directory, 'history.db'))
+        self.temp_unit = PREFS['temp_unit']
+
+    def refresh(self):
+        places = [(PREFS['lat'], PREFS['lon'])]
+        for (lat, lon), (cc, forecast) in zip(places, fetch.fetch_many(self.cache, self.pool, places, PREFS['appid'],
+                                                                          max_age=0)):
+            if cc is not None:
+                present.current(cc, self.temp_unit, PREFS['speed_unit'])
+            if forecast is not None:
+                present.summary(forecast, self.temp_unit, PREFS['speed_unit'])
+                present.table(forecast, self.temp_unit, PREFS['speed_unit'], theme.DEFAULT)
+                chart.layout(forecast.points, 450, 80, self.temp_unit, theme.DEFAULT)
+            self.history.add(lat, lon, cc, forecast)
+
+    def five_days(self):
+        pass
+
+    def prefs(self):
+        pass
+
+    def switch_units(self):
+        self.temp_unit = 'F' if self.temp_unit == 'C' else 'C'
+
+    def close(self):
+        self.pool.shutdown()
+        self.transport.close()
+        self.history.close()
+
+
+class Widget:
+    """ The real window, refreshed through the_loop as its timers would """
+
+    def __init__(self, directory):
+        from suite import WidgetPhases
+        self.phases = WidgetPhases(directory, None, None)
+        self.phases.build()
+        self.win = self.phases.win
+        self.Gtk = self.phases.Gtk
+
+    def refresh(self):
+        self.win.the_loop(max_age=0)
+        deadline = time.monotonic() + 30
+        while self.win.refresh_cancel is not None and time.monotonic() < deadline:
+            self.Gtk.main_iteration_do(False) or time.sleep(0.001)
+        self.phases.drain()
+
+    def five_days(self):
+        self.phases.five_days()
+
+    def prefs(self):
+        self.win.prefs((0, 0))
+        self.phases.drain()
+        self.win.prefs_win.hide()
+        self.phases.drain()
+
+    def switch_units(self):
+        prefs = self.win.prefs_values
+        self.win.apply_prefs(dict(prefs, temp_unit='F' if prefs['temp_unit'] == 'C' else 'C'))
+        self.phases.drain()
+
+    def close(self):
+        self.win.cancel_refresh()
+        self.win.fetch_pool.shutdown()
+        self.win.transport.close()
+        self.win.history.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cycles', type=int, default=3000, help='refreshes')
+    parser.add_argument('--warmup', type=int, default=200, help='refreshes before the baseline is taken')
+    parser.add_argument('--five-day-every', type=int, default=5, help='refreshes between five day window opens')
+    parser.add_argument('--units-every', type=int, default=50)
+    parser.add_argument('--prefs-every', type=int, default=100)
+    parser.add_argument('--sample-every', type=int, default=250)
+    parser.add_argument('--rss-budget', type=float, default=8, help='MiB')
+    parser.add_argument('--object-budget', type=int, default=2000)
+    parser.add_argument('--traced-budget', type=float, default=512, help='KiB allocated by Python')
+    parser.add_argument('--headless', action='store_true')
+    add_arguments(parser)
+    parser.set_defaults(latency=0.0)
+    args = parser.parse_args()
+
+    server = StubServer(latency=args.latency, fail_rate=args.fail_rate, fail_status=args.fail_status, seed=1)
+    fetch.API = server.start()
+    directory = tempfile.mkdtemp()
+    target = Headless(directory) if args.headless else Widget(directory)
+
+    def cycle(i):
+        target.refresh()
+        if i % args.five_day_every == 0:
+            target.five_days()
+        if i % args.units_every == 0:
+            target.switch_units()
+        if i % args.prefs_every == 0:
+            target.prefs()
+
+    start = time.monotonic()
+    for i in range(1, args.warmup + 1):
+        cycle(i)
+    tracemalloc.start()
+    baseline = measure()
+    before = tracemalloc.take_snapshot()
+    print('cycle     rss MiB   objects   traced KiB   threads')
+    print('%5d  %10.1f  %8d  %11.0f  %8d' % (args.warmup, baseline[0] / 2 ** 20, baseline[1], baseline[2] / 1024,
+                                             threading.active_count()))
+    for i in range(args.warmup + 1, args.cycles + 1):
+        cycle(i)
+        if i % args.sample_every == 0 or i == args.cycles:
+            sample = measure()
+            print('%5d  %10.1f  %8d  %11.0f  %8d' % (i, sample[0] / 2 ** 20, sample[1], sample[2] / 1024,
+                                                     threading.active_count()))
+    end = measure()
+    after = tracemalloc.take_snapshot()
+    print('%d cycles in %.0f s, %d requests to the stub' % (args.cycles, time.monotonic() - start,
+                                                           sum(server.requests.values())))
+
+    print('\nlargest growth by allocation site:')
+    filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, '<frozen *>')]
+    for stat in after.filter_traces(filters).compare_to(before.filter_traces(filters), 'lineno')[:10]:
+        print(' ', stat)
+
+    growth = {'rss': (end[0] - baseline[0]) / 2 ** 20, 'objects': end[1] - baseline[1],
+              'traced': (end[2] - baseline[2]) / 1024}
+    budgets = {'rss': args.rss_budget, 'objects': args.object_budget, 'traced': args.traced_budget}
+    units = {'rss': 'MiB', 'objects': '', 'traced': 'KiB'}
+    over = [name for name in growth if growth[name] > budgets[name]]
+    print()
+    for name in growth:
+        print('%-8s grew %8.1f %-3s budget %8.1f %s' % (name, growth[name], units[name], budgets[name],
+                                                       'OVER' if name in over else 'ok'))
+
+    target.close()
+    server.shutdown()
+    shutil.rmtree(directory)
+    return 1 if over else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# Local stand-in for api.openweathermap.org and Nominatim, replaying the recorded
+# responses in bench/fixtures: /weather, /forecast and /search. It also stands in
+# for the radar: /radar.json lists frames of the last hour, and any
+# /radar/.../*.png or /tiles/.../*.png is a plain tile. Every response
+# can be held back by --latency seconds, and --fail-rate of them answered with
+# --fail-status instead (0 drops the connection without an answer).
+#
+# Run on its own to point the widget at it:
+#
+#     python3 bench/stub_server.py --port 8000 --latency 0.1 &
+#     WEATHER_WIDGET_API=http://127.0.0.1:8000/ WEATHER_WIDGET_SEARCH=http://127.0.0.1:8000/search \
+#     WEATHER_WIDGET_RADAR=http://127.0.0.1:8000/radar.json \
+#     WEATHER_WIDGET_TILES='http://127.0.0.1:8000/tiles/{z}/{x}/{y}.png' ./weather-widget.py
+#
+# or import it, as the benchmarks do: StubServer(...).start() gives the base URL.
+
+import argparse
+import json
+import os
+import random
+import struct
+import threading
+import time
+import zlib
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FIXTURES = {'/weather': 'weather.json', '/forecast': 'forecast.json', '/search': 'search.json'}
+
+
+def png(width, height, rgba):
+    """ A width x height PNG of one colour """
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+    row = b'\0' + bytes(rgba) * width
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(row * height)) + chunk(b'IEND', b''))
+
+
+TILES = {'/tiles/': png(256, 256, (230, 230, 220, 255)), '/radar/': png(256, 256, (50, 120, 255, 90))}
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port=0, latency=0.0, fail_rate=0.0, fail_status=500, seed=None):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.fail_status = fail_status
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = Counter()  # by path, plus 'failed'
+        self.bodies = {}
+        for path, name in FIXTURES.items():
+            with open(os.path.join(HERE, 'fixtures', name), 'rb') as f:
+                self.bodies[path] = f.read()
+        super().__init__(('127.0.0.1', port), Handler)
+
+    @property
+    def base(self):
+        return 'http://127.0.0.1:%d/' % self.server_port
+
+    def start(self):
+        """ Serve on a daemon thread, returns the base URL """
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self.base
+
+    def body(self, path):
+        """ (response body or None, path to count the request under) """
+        if path == '/radar.json':
+            now = int(time.time()) // 600 * 600
+            frames = [{'time': t, 'path': '/radar/%d' % t} for t in range(now - 3600, now + 1, 600)]
+            return json.dumps({'host': self.base.rstrip('/'), 'radar': {'past': frames}}).encode(), path
+        for prefix, tile in TILES.items():
+            if path.startswith(prefix) and path.endswith('.png'):
+                return tile, prefix + '*.png'
+        return self.bodies.get(path), path
+
+    def should_fail(self):
+        with self.lock:
+            return self.fail_rate > 0 and self.random.random() < self.fail_rate
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True  # headers and body go out in separate writes
+
+    def do_GET(self):
+        server = self.server
+        path = self.path.split('?')[0]
+        time.sleep(server.latency)
+        body, kind = server.body(path)
+        with server.lock:
+            server.requests[kind] += 1
+        if body is not None and server.should_fail():
+            with server.lock:
+                server.requests['failed'] += 1
+            if not server.fail_status:
+                self.close_connection = True
+                return
+            self.send_error(server.fail_status)
+            return
+        if body is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/png' if kind.endswith('.png') else 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def add_arguments(parser):
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds to hold back each response')
+    parser.add_argument('--fail-rate', type=float, default=0.0, help='fraction of requests to fail')
+    parser.add_argument('--fail-status', type=int, default=500, help='status of failed requests, 0 to drop them')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=8000)
+    add_arguments(parser)
+    args = parser.parse_args()
+    server = StubServer(args.port, args.latency, args.fail_rate, args.fail_status)
+    print("WEATHER_WIDGET_API=%s WEATHER_WIDGET_SEARCH=%ssearch WEATHER_WIDGET_RADAR=%sradar.json "
+          "WEATHER_WIDGET_TILES='%stiles/{z}/{x}/{y}.png'" % ((server.base,) * 4))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
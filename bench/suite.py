@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# End-to-end timings against bench/stub_server.py, with percentiles over many
+# iterations:
+#
+#   fetch      both requests for one place through the response cache (always a miss)
+#   parse      model.Current and model.Forecast from the decoded responses
+#   aggregate  the daily summary of one forecast
+#   layout     the forecast chart's geometry for one forecast
+#   build      Win() made, shown and drawn
+#   refresh    show_data on the built window, drawn
+#   five_days  five day window opened, drawn and hidden (built on the first iteration,
+#              which is the max, reused after)
+#   chart      the main window's forecast chart laid out, painted and drawn
+#   chart_copy the chart drawn again from its surface, as on an expose
+#
+# The last five need GTK and a display, on a headless box run it under Xvfb:
+#
+#     xvfb-run python3 bench/suite.py [--iterations 50] [--latency 0.05] [--fail-rate 0]
+#
+# --phases fetch,parse,aggregate,layout runs the GTK-free phases only.
+
+import argparse
+import importlib.util
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, os.pardir))
+
+from weather import aggregate, chart, fetch, model, theme  # noqa: E402
+from weather.cache import ResponseCache  # noqa: E402
+from weather.history import History  # noqa: E402
+from weather.transport import Transport  # noqa: E402
+from stub_server import StubServer, add_arguments  # noqa: E402
+from timing import header, percentiles, row, timed  # noqa: E402
+
+PHASES = ('fetch', 'parse', 'aggregate', 'layout', 'build', 'refresh', 'five_days', 'chart', 'chart_copy')
+GTK_PHASES = {'build', 'refresh', 'five_days', 'chart', 'chart_copy'}
+# Every pref, as get_prefs fills in
+PREFS = {'appid': 'bench', 'lat': '51.5', 'lon': '0.0', 'loc': 'London', 'temp_unit': 'C', 'speed_unit': 'mph',
+         'timeout': '15', 'font_size': '12', 'x': '250', 'y': '10', 'locations': '', 'theme': 'custom.css'}
+
+
+class WidgetPhases:
+    """ The GTK phases, on a window whose response cache is in a temporary directory """
+
+    def __init__(self, directory, current, forecast):
+        import gi
+        gi.require_version('Gtk', '3.0')
+        from gi.repository import GLib, Gtk
+        self.GLib = GLib
+        self.Gtk = Gtk
+
+        spec = importlib.util.spec_from_file_location('weather_widget', os.path.join(HERE, os.pardir, 'weather-widget.py'))
+        self.widget = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(self.widget)
+        self.widget.Win.get_prefs = lambda win: dict(PREFS)
+        self.widget.ResponseCache = lambda path, transport: ResponseCache(directory, transport)
+        self.widget.History = lambda path: History(os.path.join(directory, 'history.db'))
+        self.current = current
+        self.forecast = forecast
+        self.win = None
+
+    def drain(self):
+        while self.Gtk.events_pending():
+            self.Gtk.main_iteration()
+
+    def build(self):
+        if self.win is not None:
+            if self.win.five_day_win is not None:
+                self.win.five_day_win.destroy()
+            self.win.destroy()
+            self.win.transport.close()
+            self.win.fetch_pool.shutdown()
+        self.win = self.widget.Win()
+        self.win.show_all()
+        self.drain()
+
+    def refresh(self):
+        self.win.show_data(self.current, self.forecast, threading.Event())
+        self.drain()
+
+    def five_days(self):
+        """ Opens the window, lets it draw and hides it again. The first time builds it,
+            after that it is reused """
+        self.win.five_days((0, 0))
+        self.drain()
+        self.win.five_day_win.hide()
+        self.drain()
+
+    def chart(self):
+        """ Forgets the painted surface so the next draw lays out and paints """
+        self.win.chart.surface_key = None
+        self.win.chart.queue_draw()
+        self.drain()
+
+    def chart_copy(self):
+        self.win.chart.queue_draw()
+        self.drain()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--phases', default=','.join(PHASES))
+    add_arguments(parser)
+    args = parser.parse_args()
+    phases = args.phases.split(',')
+
+    server = StubServer(latency=args.latency, fail_rate=args.fail_rate, fail_status=args.fail_status, seed=1)
+    fetch.API = server.start()
+    directory = tempfile.mkdtemp()
+    transport = Transport()
+    cache = ResponseCache(directory, transport)
+    cache.ttl = {'weather': 0, 'forecast': 0}  # no validators from the stub, so every fetch is a full request
+    pool = ThreadPoolExecutor(max_workers=2)
+
+    responses = []
+    for name in ('weather', 'forecast'):
+        with open(os.path.join(HERE, 'fixtures', name + '.json')) as f:
+            responses.append(json.load(f))
+    current, forecast = model.Current(responses[0]), model.Forecast(responses[1])
+    failures = []
+
+    def fetch_once():
+        try:
+            for job in fetch.submit(cache, pool, PREFS['lat'], PREFS['lon'], PREFS['appid']):
+                job.result()
+        except Exception as e:
+            failures.append(e)
+
+    work = {
+        'fetch': fetch_once,
+        'parse': lambda: (model.Current(responses[0]), model.Forecast(responses[1])),
+        'aggregate': lambda: aggregate.daily(aggregate.Columns().add_forecast(responses[1])),
+        'layout': lambda: chart.layout(forecast.points, 450, 80, 'C', theme.DEFAULT),
+    }
+    if GTK_PHASES & set(phases):
+        widgets = WidgetPhases(directory, current, forecast)
+        widgets.build()
+        widgets.refresh()
+        work.update(build=widgets.build, refresh=widgets.refresh, five_days=widgets.five_days,
+                    chart=widgets.chart, chart_copy=widgets.chart_copy)
+
+    print('%d iterations, %.0f ms latency, %.0f%% failures' % (args.iterations, args.latency * 1000, args.fail_rate * 100))
+    print(header(10))
+    for phase in phases:
+        print(row(phase, timed(work[phase], args.iterations), 10))
+    if {'chart', 'chart_copy'} & set(phases):
+        for kind in ('paint', 'copy'):
+            times = [seconds for done, seconds in widgets.win.chart.draw_times if done == kind]
+            if times:
+                print('chart draw handler, %s: p50 %.2f ms' % (kind, percentiles(times)[0]))
+    if failures:
+        print('%d failed fetches, e.g. %s' % (len(failures), failures[0]))
+
+    pool.shutdown()
+    transport.close()
+    server.shutdown()
+    shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+# Timing shared by the benchmarks, so they all measure and report the same way:
+# every run is kept and the spread printed as p50, p90, p99 and max in ms.
+
+import time
+
+
+def timed(fn, iterations):
+    """ Seconds each of iterations calls of fn took """
+    times = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def percentiles(times):
+    """ (p50, p90, p99, max) of times in seconds, as ms """
+    times = sorted(times)
+
+    def at(p):
+        return times[min(len(times) - 1, int(len(times) * p / 100))] * 1000
+    return at(50), at(90), at(99), times[-1] * 1000
+
+
+def header(width=24):
+    return '%-*s %9s %9s %9s %9s' % (width, '', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms')
+
+
+def row(label, times, width=24):
+    """ label and the percentiles of times, under header() """
+    return '%-*s %9.3f %9.3f %9.3f %9.3f' % ((width, label) + percentiles(times))
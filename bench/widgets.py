@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# Checks that a refresh of the main window allocates no widgets. Exits non-zero
+# if it does, so it can be run by hand or from CI:
+#
+#     xvfb-run python3 bench/widgets.py
+#
+# It first checks the GTK-free half, which runs anywhere: two refreshes bringing
+# the same data give the same text and icon for every label and image, which is
+# what lets update_label and update_icon leave them alone. It then counts the GTK
+# widgets created over 100 simulated refreshes. The grid is built once in
+# Win.__init__, so after that there should be none. Without PyGObject or a
+# display that count is skipped, with a message, and only the first check decides
+# the exit status.
+
+import collections
+import importlib.util
+import json
+import os
+import sys
+import threading
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REFRESHES = 100
+
+sys.path.insert(0, os.path.join(HERE, os.pardir))
+from weather import model, present  # noqa: E402
+
+created = collections.Counter()
+
+
+class Counted:
+    """ Stands in for a Gtk widget class and counts instances made through it """
+
+    def __init__(self, cls):
+        self.cls = cls
+
+    def __call__(self, *args, **kwargs):
+        created[self.cls.__name__] += 1
+        return self.cls(*args, **kwargs)
+
+    def __getattr__(self, name):
+        attr = getattr(self.cls, name)
+        if name.startswith('new'):
+            def constructor(*args, **kwargs):
+                created[self.cls.__name__] += 1
+                return attr(*args, **kwargs)
+            return constructor
+        return attr
+
+
+class CountingGtk:
+    def __init__(self, Gtk):
+        self.Gtk = Gtk
+
+    def __getattr__(self, name):
+        attr = getattr(self.Gtk, name)
+        if isinstance(attr, type) and issubclass(attr, self.Gtk.Widget):
+            return Counted(attr)
+        return attr
+
+
+def load(name):
+    with open(os.path.join(HERE, 'fixtures', name)) as f:
+        return json.load(f)
+
+
+def labels(cc, forecast):
+    """ Everything the grid's labels and images show for cc and forecast, decoded JSON """
+    current = present.current(model.Current(cc), 'C', 'mph')
+    days = present.summary(model.Forecast(forecast), 'C', 'mph')
+    return ([getattr(current, name) for name in present.CurrentView.__slots__]
+            + [getattr(day, name) for day in days for name in present.DayView.__slots__])
+
+
+def gtk():
+    """ Gtk, or None with the reason if there is no PyGObject or no display """
+    try:
+        import gi
+        gi.require_version('Gtk', '3.0')
+        from gi.repository import Gtk
+    except (ImportError, ValueError) as e:
+        return None, str(e)
+    if not Gtk.init_check(sys.argv)[0]:
+        return None, 'no display'
+    return Gtk, None
+
+
+def main():
+    cc, forecast = load('weather.json'), load('forecast.json')
+    same = labels(cc, forecast) == labels(json.loads(json.dumps(cc)), json.loads(json.dumps(forecast)))
+    print('labels unchanged by a refresh with the same data: %s' % ('yes' if same else 'NO'))
+    Gtk, reason = gtk()
+    if Gtk is None:
+        print('widget count skipped: %s' % reason)
+        sys.exit(0 if same else 1)
+
+    spec = importlib.util.spec_from_file_location('weather_widget', os.path.join(HERE, os.pardir, 'weather-widget.py'))
+    weather_widget = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(weather_widget)
+    weather_widget.Gtk = CountingGtk(Gtk)
+    weather_widget.Win.get_prefs = lambda self: {
+        'appid': '', 'lat': '51.5', 'lon': '0.0', 'loc': 'London', 'temp_unit': 'C', 'speed_unit': 'mph',
+        'timeout': '15', 'font_size': '12', 'x': '250', 'y': '10'}
+
+    win = weather_widget.Win()
+    win.show_all()
+    print('widgets created building the window: %d' % sum(created.values()))
+
+    created.clear()
+    for i in range(REFRESHES):
+        # Vary the data a little so labels really change
+        cc['main']['temp'] += 0.1
+        forecast['list'][i % 40]['main']['temp'] += 1
+        win.show_data(model.Current(cc), model.Forecast(forecast), threading.Event())
+        while Gtk.events_pending():
+            Gtk.main_iteration()
+
+    total = sum(created.values())
+    print('widgets created over %d refreshes: %d %s' % (REFRESHES, total, dict(created)))
+    sys.exit(0 if same and not total else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -16,36 +16,321 @@
 # Web: donatherton.co.uk
 # WeatherWidget (c) Don Atherton don@donatherton.co.uk
 
+import time
+STARTED = time.monotonic()  # for the startup timing report
+
 import gi
 gi.require_version("Gtk", "3.0")
-from gi.repository import Gtk, Gdk, GdkPixbuf, GLib, Gio, WebKit2
-import urllib.request
+from gi.repository import Gtk, Gdk, GdkPixbuf, GLib, Gio, Pango, PangoCairo
+import cairo
 from datetime import datetime
-import json
+from html import escape
+from collections import OrderedDict, deque
+import math
 import os
-import sys
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from weather import chart, present, radar, settings, theme, trace
+from weather.cache import ResponseCache
+from weather.fetch import ENDPOINTS, cached, fetch_many
+from weather.gazetteer import Gazetteer
+from weather.geosearch import GeoSearch
+from weather.history import History
+from weather.radar import Radar, TileCache
+from weather.schedule import FORECAST_PERIOD, Schedule
+from weather.transport import Transport
+
+
+FRAME_INTERVAL = 500  # ms each radar frame is shown
+
+
+class IconCache:
+    """ Decoded and scaled icons shared by every window, keyed by (icon set, icon, size).
+        Least recently used pixbufs are dropped once there are more than max_entries """
+
+    # (icon set directory, sizes used). bearingicons is for when wind direction icons are back
+    sets = [('PNG', (70, 30, 20)), ('bearingicons', (60,))]
+
+    def __init__(self, path, max_entries=256):
+        self.path = path
+        self.max_entries = max_entries
+        self.pixbufs = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, icon, size, icon_set='PNG'):
+        key = (icon_set, icon, size)
+        with self.lock:
+            pixbuf = self.pixbufs.get(key)
+            if pixbuf is not None:
+                self.pixbufs.move_to_end(key)
+                return pixbuf
+        with trace.span('load icon', icon=icon, size=size):
+            pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_size(os.path.join(self.path, icon_set, icon + '.png'), size, size)
+        with self.lock:
+            self.pixbufs[key] = pixbuf
+            while len(self.pixbufs) > self.max_entries:
+                self.pixbufs.popitem(last=False)
+        return pixbuf
+
+    def warm(self):
+        """ Decode every icon at the sizes we use. Run in a background thread at startup """
+        for icon_set, sizes in self.sets:
+            try:
+                names = sorted(os.listdir(os.path.join(self.path, icon_set)))
+            except FileNotFoundError:
+                continue
+            for name in names:
+                if name.endswith('.png'):
+                    for size in sizes:
+                        self.get(name[:-4], size, icon_set)
+
+
+class Styles:
+    """ Every CSS provider the widget uses, by name. Each is added to the screen once,
+        the first time it is loaded, and later loads replace its contents. Providers
+        loaded later take precedence """
+
+    def __init__(self, screen):
+        self.screen = screen
+        self.providers = {}
+
+    def provider(self, name):
+        provider = self.providers.get(name)
+        if provider is None:
+            provider = self.providers[name] = Gtk.CssProvider()
+            Gtk.StyleContext.add_provider_for_screen(self.screen, provider, Gtk.STYLE_PROVIDER_PRIORITY_APPLICATION)
+        return provider
+
+    def load_data(self, name, css):
+        self.provider(name).load_from_data(css)
+
+    def load_path(self, name, path):
+        self.provider(name).load_from_path(path)
+
+
+def show_label(widget, cr, x, y, markup):
+    """ Pango markup drawn on cr at x, y in widget's font """
+    layout = widget.create_pango_layout(None)
+    layout.set_markup(markup, -1)
+    cr.move_to(x, y)
+    PangoCairo.show_layout(cr, layout)
+
+
+class ForecastChart(Gtk.DrawingArea):
+    """ The 3 hourly forecast drawn by weather.chart. The picture is kept in a surface
+        and only painted again for new data, units, theme or size, any other redraw
+        copies the surface """
+
+    def __init__(self, height):
+        super().__init__()
+        self.set_size_request(-1, height)
+        self.shown = (None, None, None)  # (forecast, temp unit, palette)
+        self.surface = None
+        self.surface_key = None  # what the surface was painted for
+        self.draw_times = deque(maxlen=100)  # (paint or copy, seconds) of the latest draws
+        self.connect('draw', self.draw_chart)
+
+    def set_forecast(self, forecast, temp_unit, palette):
+        shown = (forecast, temp_unit, palette)
+        if shown != self.shown:
+            self.shown = shown
+            self.queue_draw()
+
+    def draw_chart(self, widget, cr):
+        start = time.perf_counter()
+        forecast, temp_unit, palette = self.shown
+        if forecast is None:
+            return False
+        width, height = self.get_allocated_width(), self.get_allocated_height()
+        colour = self.get_style_context().get_color(Gtk.StateFlags.NORMAL)
+        text_rgb = (colour.red, colour.green, colour.blue)
+        key = self.shown + (width, height, text_rgb)
+        painted = key != self.surface_key
+        if painted:
+            with trace.span('chart paint', points=len(forecast.points)):
+                geometry = chart.layout(forecast.points, width, height, temp_unit, palette)
+                self.surface = self.get_window().create_similar_surface(cairo.CONTENT_COLOR_ALPHA, width, height)
+                surface_cr = cairo.Context(self.surface)
+                chart.paint(surface_cr, geometry,
+                            lambda x, y, text: show_label(self, surface_cr, x, y, '<small>' + escape(text) + '</small>'),
+                            text_rgb)
+                self.surface_key = key
+        cr.set_source_surface(self.surface, 0, 0)
+        cr.paint()
+        self.draw_times.append(('paint' if painted else 'copy', time.perf_counter() - start))
+        return False
+
+
+class RadarView(Gtk.DrawingArea):
+    """ Precipitation radar over a map, animated through the frames weather.radar
+        finds. Tiles are downloaded and decoded on the radar's pool and drawn as they
+        arrive. Decoded tiles are only kept while the view is on screen """
+
+    def __init__(self, radar):
+        super().__init__()
+        self.radar = radar
+        self.set_size_request(450, 450)
+        self.place = None  # (lat, lon)
+        self.frames = []
+        self.frame = 0
+        self.tiles = []  # weather.radar.view_tiles of the place and size
+        self.tiles_key = None
+        self.requested = set()  # urls queued since the view was last shown
+        self.pixbufs = {}  # url -> decoded on screen tile
+        self.cancel = None
+        self.timer = None
+        self.connect('draw', self.draw_radar)
+        self.connect('unmap', lambda widget: self.stop())
+
+    def show_place(self, lat, lon):
+        """ Start showing lat, lon (floats), from the latest frame list """
+        self.stop()
+        self.place = (lat, lon)
+        cancel = self.cancel = threading.Event()
+        threading.Thread(target=self.load_frames, args=(cancel,), daemon=True).start()
+        self.timer = GLib.timeout_add(FRAME_INTERVAL, self.next_frame)
+
+    def stop(self):
+        """ Stop animating and downloading, and let go of the decoded tiles """
+        if self.cancel is not None:
+            self.cancel.set()
+            self.cancel = None
+        if self.timer is not None:
+            GLib.source_remove(self.timer)
+            self.timer = None
+        self.requested = set()
+        self.pixbufs = {}
+        self.tiles_key = None
+
+    def load_frames(self, cancel):
+        try:
+            frames = self.radar.frames(cancel)
+        except Exception as e:
+            print(e)
+            return
+        if frames and not cancel.is_set():
+            GLib.idle_add(self.got_frames, frames, cancel)
+
+    def got_frames(self, frames, cancel):
+        if not cancel.is_set():
+            if frames != self.frames:
+                self.frames = frames
+                self.frame = len(frames) - 1
+            self.tiles_key = None
+            self.queue_draw()
+        return False
+
+    def next_frame(self):
+        if self.frames:
+            self.frame = (self.frame + 1) % len(self.frames)
+            self.queue_draw()
+        return True
+
+    def tile_arrived(self, url, data, cancel):
+        """ On the pool's thread, decode for the main loop """
+        if cancel.is_set():
+            return
+        loader = GdkPixbuf.PixbufLoader()
+        try:
+            loader.write(data)
+            loader.close()
+        except GLib.Error as e:
+            print(url, e)
+            return
+        GLib.idle_add(self.add_tile, url, loader.get_pixbuf(), cancel)
+
+    def add_tile(self, url, pixbuf, cancel):
+        if not cancel.is_set():
+            self.pixbufs[url] = pixbuf
+            self.queue_draw()
+        return False
+
+    def draw_radar(self, widget, cr):
+        if self.cancel is None or not self.frames:
+            return False
+        width, height = self.get_allocated_width(), self.get_allocated_height()
+        zoom = self.radar.zoom
+        key = (self.place, width, height, len(self.frames), self.frames[-1][0])
+        if key != self.tiles_key:
+            # The view moved, resized or has new frames: queue what isn't already
+            self.tiles_key = key
+            self.tiles = radar.view_tiles(self.place[0], self.place[1], zoom, width, height)
+            urls = [url for url in self.radar.urls(self.frames, self.frame, self.tiles) if url[0] not in self.requested]
+            self.requested.update(url for url, on_screen in urls)
+            cancel = self.cancel
+            self.radar.prefetch(urls, cancel, lambda url, data: self.tile_arrived(url, data, cancel))
+
+        cr.set_source_rgb(0.8, 0.8, 0.8)
+        cr.paint()
+        template = self.frames[self.frame][1]
+        for x, y, left, top, on_screen in self.tiles:
+            if not on_screen:
+                break
+            for url in (radar.tile_url(radar.BASE_URL, zoom, x, y), radar.tile_url(template, zoom, x, y)):
+                pixbuf = self.pixbufs.get(url)
+                if pixbuf is not None:
+                    Gdk.cairo_set_source_pixbuf(cr, pixbuf, left, top)
+                    cr.paint()
+
+        # The place, and the time of the frame
+        cr.set_source_rgb(0.8, 0, 0)
+        cr.arc(width / 2, height / 2, 4, 0, 2 * math.pi)
+        cr.fill()
+        frame_time = datetime.fromtimestamp(self.frames[self.frame][0]).strftime('%H:%M')
+        if self.frames[self.frame][0] > time.time():
+            frame_time += ' (forecast)'
+        cr.set_source_rgb(0, 0, 0)
+        show_label(self, cr, 8, 8, '<b>' + frame_time + '</b>')
+        return False
 
 
 class Win(Gtk.Window):
     def __init__(self):
         super().__init__()
         self.path = os.path.dirname(__file__)
+        self.transport = Transport()
+        self.icons = IconCache(self.path)
+        self.geosearch = GeoSearch(self.transport, Gazetteer(self.path + os.sep + 'gazetteer.txt',
+                                                             self.path + os.sep + 'gazetteer.idx'))
+        threading.Thread(target=self.icons.warm, daemon=True).start()
+        # Secondary windows, built the first time they are opened and then only hidden
+        self.prefs_win = None
+        self.five_day_win = None
+        self.five_day_shown = ()  # (forecast, units, palette, font size) the table was filled for
+        self.five_day_rows = []  # and its rows, to change only the ones that differ
+        self.radar_win = None
         self.prefs_values = self.get_prefs()
         self.grid = Gtk.Grid()
         self.Json = {}
-
-        # CSS
-        css = bytes('window {font-size: ' + str(self.prefs_values['font_size']) + 'px;}', 'UTF-8')
+        self.refresh_cancel = None  # threading.Event of the in-flight refresh
+        self.refresh_endpoints = ()  # and what it is fetching
+        self.refresh_max_age = None
+        self.fetch_pool = ThreadPoolExecutor(max_workers=4)  # bounds the requests in flight
+        self.cache = ResponseCache(self.path + os.sep + 'cache', self.transport)
+        self.history = History(self.path + os.sep + 'history.db')  # everything fetched, for trends
+        self.current = None  # data for the place on show
+        self.forecast = None
+        self.places = []  # every configured place, with its last data
+        self.place = 0  # index of the one on show
+        self.set_places()
+        self.timing = {}  # startup milestones, seconds since STARTED
+        period = self.get_timeout() * 60
+        self.schedules = {'weather': Schedule(period, period, time.time()),
+                          'forecast': Schedule(max(period, FORECAST_PERIOD), period, time.time())}
+        self.refresh_timers = {}  # endpoint -> GLib source of its next scheduled refresh
+
+        # CSS: font size from prefs, then the theme stylesheet (custom.css unless prefs says otherwise)
         screen = Gdk.Screen.get_default()
-        provider = Gtk.CssProvider()
-        provider.load_from_data(css)
-        Gtk.StyleContext.add_provider_for_screen(screen, provider, Gtk.STYLE_PROVIDER_PRIORITY_APPLICATION)
-        try:
-            custom = Gtk.CssProvider()  # From custom.css file
-            custom.load_from_file(Gio.File.new_for_path(self.path + os.sep + 'custom.css'))
-            Gtk.StyleContext.add_provider_for_screen(screen, custom, Gtk.STYLE_PROVIDER_PRIORITY_APPLICATION)
-        except FileNotFoundError:
-            pass
+        self.styles = Styles(screen)
+        self.palette = theme.DEFAULT  # 5 day table colours, from the theme's @define-colors
+        self.load_font_css()
+
+        # Pick up edits to prefs and the theme without a restart
+        self.monitors = {}
+        self.watch('prefs', self.reload_prefs)
+        self.load_theme()
 
         # Set up main window
         self.set_default_size(410, 310)
@@ -72,11 +357,25 @@ class Win(Gtk.Window):
         hbox.pack_start(fivedaybutton, False, False, 0)
         fivedaybutton.set_tooltip_text('3 hourly forecast for next 5 days')
 
+        # Switch between places, only shown if there is more than one
+        self.place_switcher = Gtk.HBox()
+        self.place_switcher.set_no_show_all(True)
+        hbox.pack_end(self.place_switcher, False, False, 0)
+        previous_place = Gtk.Button.new_with_label('\N{SINGLE LEFT-POINTING ANGLE QUOTATION MARK}')
+        previous_place.connect('clicked', lambda button: self.show_place(self.place - 1))
+        self.place_label = Gtk.Label()
+        next_place = Gtk.Button.new_with_label('\N{SINGLE RIGHT-POINTING ANGLE QUOTATION MARK}')
+        next_place.connect('clicked', lambda button: self.show_place(self.place + 1))
+        for widget in (previous_place, self.place_label, next_place):
+            self.place_switcher.pack_start(widget, False, False, 0)
+            widget.show()
+        self.update_place_switcher()
+
         # Button for rainfall radar
-        #radar = Gtk.LinkButton.new_with_label("Rainfall radar")
-        #radar.connect("clicked", self.call_radar)
-        #hbox.pack_end(radar, False, False, 0)
-        #radar.set_tooltip_text('Rainfall radar')
+        radar_button = Gtk.LinkButton.new_with_label("Rainfall radar")
+        radar_button.connect("clicked", self.call_radar)
+        hbox.pack_end(radar_button, False, False, 0)
+        radar_button.set_tooltip_text('Rainfall radar')
 
         # Right-click menu
         menu = Gtk.Menu()
@@ -97,43 +396,170 @@ class Win(Gtk.Window):
         menu.append(close_widget)
         close_widget.show()
 
+        self.build_grid()
+        self.connect('draw', self.first_draw)
+        self.trace_frames(self)
+
         self.connect('button_press_event', self.button_press, menu)
         reload.connect('button_press_event', self.refresh)
         preferences.connect('button_press_event', self.set_preferences)
         close_widget.connect('button_press_event', self.stop)
 
+    def load_font_css(self):
+        css = bytes('window {font-size: ' + str(self.prefs_values['font_size']) + 'px;}', 'UTF-8')
+        self.styles.load_data('font', css)
+
+    def load_theme(self):
+        """ (Re)load the theme stylesheet into the one theme provider, and compile the
+            table colours it defines """
+        name = self.prefs_values.get('theme') or settings.DEFAULTS['theme']
+        if name not in self.monitors:
+            for old in [n for n in self.monitors if n != 'prefs']:
+                self.monitors.pop(old).cancel()
+            self.watch(name, self.load_theme)
+        try:
+            self.styles.load_path('theme', self.path + os.sep + name)
+        except GLib.Error as e:  # missing, or a half saved edit
+            print(e)
+            return
+        context = self.get_style_context()
+        overrides = {}
+        for colour in theme.colour_names():
+            found, rgba = context.lookup_color(colour)
+            if found:
+                overrides[colour] = '#%02x%02x%02x' % (round(rgba.red * 255), round(rgba.green * 255), round(rgba.blue * 255))
+        self.palette = theme.Palette(overrides) if overrides else theme.DEFAULT
+        if hasattr(self, 'day_columns'):  # not while starting up
+            self.redraw()
+
+    def watch(self, name, handler):
+        """ Call handler when the file name next to prefs changes """
+        monitor = Gio.File.new_for_path(self.path + os.sep + name).monitor_file(Gio.FileMonitorFlags.NONE, None)
+        monitor.connect('changed', self.file_changed, handler)
+        self.monitors[name] = monitor
+
+    @staticmethod
+    def file_changed(monitor, file, other_file, event, handler):
+        if event in (Gio.FileMonitorEvent.CHANGES_DONE_HINT, Gio.FileMonitorEvent.CREATED):
+            handler()
+
+    def reload_prefs(self):
+        """ Re-read the prefs file and apply it """
+        try:
+            new_values = settings.read(self.path + os.sep + 'prefs')
+        except (IndexError, FileNotFoundError):
+            return
+        self.apply_prefs(new_values)
+
+    def apply_prefs(self, new_values):
+        """ Apply the prefs file's new_values live, doing only what each change needs.
+            Anything no longer in the file goes back to its default """
+        old_values = self.prefs_values
+        new_values = dict(settings.DEFAULTS, **new_values)
+        self.prefs_values = new_values
+        if not hasattr(self, 'day_columns'):  # Still starting up, nothing to update yet
+            return
+        changed = {name for name in new_values if new_values[name] != old_values.get(name)}
+        if 'font_size' in changed:
+            self.load_font_css()
+            self.five_days_changed()
+        if 'theme' in changed:
+            self.load_theme()
+        if changed & {'x', 'y'}:
+            self.move(int(new_values['x']), int(new_values['y']))
+        if 'timeout' in changed:
+            self.schedule_refresh()
+        if changed & {'lat', 'lon', 'loc', 'locations'}:
+            self.set_places()
+            self.update_place_switcher()
+        if changed & {'lat', 'lon', 'appid', 'locations'}:
+            self.show_place(self.place)
+            self.the_loop()
+        elif changed & {'loc', 'temp_unit', 'speed_unit'}:
+            self.redraw()
+
+    def set_places(self):
+        """ Places from prefs, keeping the data we have for any that were already there """
+        known = {(place['lat'], place['lon']): place for place in self.places}
+        self.places = []
+        for loc, lat, lon in settings.places(self.prefs_values):
+            place = known.get((lat, lon), {'lat': lat, 'lon': lon, 'current': None, 'forecast': None, 'updated': None})
+            place['loc'] = loc
+            self.places.append(place)
+        self.place = min(self.place, len(self.places) - 1)
+
+    def update_place_switcher(self):
+        if len(self.places) > 1:
+            self.place_label.set_text(str(self.place + 1) + '/' + str(len(self.places)))
+            self.place_switcher.show()
+        else:
+            self.place_switcher.hide()
+
+    def show_place(self, index):
+        """ Switch the display to another place, from memory or its snapshot """
+        self.place = index % len(self.places)
+        place = self.places[self.place]
+        self.current = place['current']
+        self.forecast = place['forecast']
+        self.update_place_switcher()
+        if self.current is None and self.forecast is None:
+            self.grid.get_style_context().add_class('stale')
+            if self.show_snapshot():
+                return
+        else:
+            self.grid.get_style_context().remove_class('stale')
+        self.redraw()
+
+    def redraw(self):
+        """ Re-render the data we already have, e.g. after a unit change. Either half
+            of the grid we have nothing for is left blank """
+        if self.current is not None:
+            self.show_current(self.current)
+        else:
+            self.clear_current()
+        if self.forecast is not None:
+            self.show_summary()
+        else:
+            self.clear_summary()
+        self.five_days_changed()
+
+    def schedule_refresh(self):
+        """ Re-time the scheduled refreshes after the timeout has changed """
+        period = self.get_timeout() * 60
+        now = time.time()
+        self.schedules['weather'].set_period(period, period, now)
+        self.schedules['forecast'].set_period(max(period, FORECAST_PERIOD), period, now)
+        for endpoint in list(self.refresh_timers):
+            self.schedule_endpoint(endpoint)
+
+    def schedule_endpoint(self, endpoint):
+        """ (Re)start endpoint's timer for when its schedule says it is due """
+        if endpoint in self.refresh_timers:
+            GLib.source_remove(self.refresh_timers[endpoint])
+        self.refresh_timers[endpoint] = GLib.timeout_add_seconds(
+            self.schedules[endpoint].delay(time.time()), self.scheduled_refresh, endpoint)
+
+    def scheduled_refresh(self, endpoint):
+        del self.refresh_timers[endpoint]
+        self.the_loop((endpoint,), max_age=0)
+        return False
+
     def get_prefs(self):
         prefs_file = self.path + os.sep + 'prefs'
-        default_prefs = {
-            'appid': 'API key from https://home.openweathermap.org',
-            'lat': '51.5',
-            'lon': '0.0',
-            'loc': 'London',
-            'temp_unit': 'C',
-            'speed_unit': 'mph',
-            'timeout': '15',
-            'font_size': '12',
-            'x': '250',
-            'y': '10'
-        }
         try:
-            with open(prefs_file, 'r') as file_object:
-                prefs_values = {}
-                for line in file_object:
-                    pref_value = line.split(',')
-                    prefs_values[pref_value[0]] = pref_value[1].strip()
+            self.prefs_values = dict(settings.DEFAULTS, **settings.read(prefs_file))
         except (IndexError, FileNotFoundError):
             print('No prefs file, creating one')
             print('API key required')
             with open(prefs_file, 'w'): pass
-            self.prefs_values = default_prefs
+            self.prefs_values = dict(settings.DEFAULTS)
             print(self.prefs_values)
             # Bring up prefs dialog
             self.prefs([250, 10])
-        return prefs_values
+        return self.prefs_values
 
-    #def call_radar(self, button):
-    #    self.rainfall_radar()
+    def call_radar(self, button):
+        self.rainfall_radar()
 
     def get_timeout(self):
         """ Time to refresh. timeout is accessed from outside, so use get method """
@@ -145,14 +571,17 @@ class Win(Gtk.Window):
         return timeout
 
     def call_five_day(self, button):
+        if self.forecast is None:
+            return
         pos = self.get_position()
         self.five_days(pos)
 
-    @staticmethod
-    def refresh(widget, event):
+    def refresh(self, widget, event):
         # reload
         if event.type == Gdk.EventType.BUTTON_PRESS and event.button == 1:
-            os.execv(sys.argv[0], sys.argv)
+            self.load_theme()
+            self.reload_prefs()
+            self.the_loop()
 
     @staticmethod
     def button_press(widget, event, menu):
@@ -160,9 +589,15 @@ class Win(Gtk.Window):
         if event.type == Gdk.EventType.BUTTON_PRESS and event.button == 3:
             menu.popup(None, None, None, event.button, 1, event.time)
 
-    @staticmethod
-    def stop(widget, event):
+    def stop(self, widget, event):
         if event.type == Gdk.EventType.BUTTON_PRESS and event.button == 1:
+            self.cancel_refresh()
+            self.fetch_pool.shutdown(wait=False, cancel_futures=True)
+            if self.radar_win is not None:
+                self.radar_view.stop()
+                self.radar_pool.shutdown(wait=False, cancel_futures=True)
+            self.transport.close()
+            self.history.close()
             Gtk.main_quit()
 
     def set_preferences(self, widget, event):
@@ -171,119 +606,169 @@ class Win(Gtk.Window):
             pos = self.get_position()
             self.prefs(pos)
 
-    def wnd_spd_unit(self, wndspd):
-        if self.prefs_values['speed_unit'] == 'm/s':
-            pass
-        elif self.prefs_values['speed_unit'] == 'kph':
-            wndspd = wndspd * 3.6
-        elif self.prefs_values['speed_unit'] == 'mph':
-            wndspd = wndspd * 2.23694
-        elif self.prefs_values['speed_unit'] == 'kt':
-            wndspd = wndspd * 1.944
-        elif self.prefs_values['speed_unit'] == 'Bf':
-            wndspd = (float(wndspd) / 0.836) ** (2 / 3)
-        return wndspd
-
-    def temp_convert(self, t):
-        if self.prefs_values['temp_unit'] == 'F':
-                temp = (t * 1.8) + 32
-        else:
-                temp = t
-        return temp
+    def the_loop(self, endpoints=ENDPOINTS, max_age=None):
+        """ Starts a refresh of endpoints in a worker thread. A refresh still in flight is
+            replaced by one fetching what both wanted. max_age goes to the cache, the
+            schedules use 0 as they already know the data is due """
+        if self.refresh_cancel is not None:
+            endpoints = tuple(e for e in ENDPOINTS if e in endpoints or e in self.refresh_endpoints)
+            if self.refresh_max_age == 0:
+                max_age = 0
+        self.cancel_refresh()
+        cancel = threading.Event()
+        self.refresh_cancel = cancel
+        self.refresh_endpoints = endpoints
+        self.refresh_max_age = max_age
+        worker = threading.Thread(target=self.fetch_data, args=(cancel, endpoints, max_age), daemon=True)
+        worker.start()
+
+    def cancel_refresh(self):
+        """ Abandon any refresh still in flight """
+        if self.refresh_cancel is not None:
+            self.refresh_cancel.set()
+            self.refresh_cancel = None
+
+    def fetch_data(self, cancel, endpoints, max_age):
+        """ Runs in the worker thread. Every place is requested at once through the pool,
+            only the decoded data goes back to the main loop """
+        places = self.places
+        with trace.span('refresh', places=len(places), endpoints=endpoints):
+            results = fetch_many(self.cache, self.fetch_pool, [(place['lat'], place['lon']) for place in places],
+                                 self.prefs_values['appid'], cancel, endpoints, max_age)
+        with trace.span('history'):
+            try:
+                for place, (cc, forecast) in zip(places, results):
+                    self.history.add(place['lat'], place['lon'], cc, forecast)
+            except sqlite3.Error as e:
+                print(e)
+        if not cancel.is_set():
+            GLib.idle_add(self.show_results, places, results, cancel, endpoints)
+
+    def show_results(self, places, results, cancel, endpoints):
+        """ Keep each place's new data, then show the one on display """
+        if cancel.is_set():
+            return False
+        self.refresh_cancel = None
+        self.reschedule(results, endpoints)
+        if places is not self.places:
+            return False
+        now = time.time()
+        for place, (cc, forecast) in zip(places, results):
+            if cc is not None:
+                place['current'] = cc
+                place['updated'] = now
+            if forecast is not None:
+                place['forecast'] = forecast
+        cc, forecast = results[self.place]
+        if cc is not None or forecast is not None:
+            self.show_data(cc, forecast, cancel)
+        trace.write()
+        return False
+
+    def reschedule(self, results, endpoints):
+        """ Time the next refresh of each endpoint just fetched: from the newest server
+            timestamp of the places that came back, with backoff only if none did. A
+            place that failed keeps its last data until the next refresh """
+        now = time.time()
+        for index, endpoint in enumerate(ENDPOINTS):
+            if endpoint not in endpoints:
+                continue
+            schedule = self.schedules[endpoint]
+            schedule.fetched(self.cache.requests.get(endpoint, 0) - schedule.requests)  # not those served from the cache
+            got = [result[index] for result in results if result[index] is not None]
+            if not got:
+                schedule.failure(now)
+            elif endpoint == 'weather':
+                schedule.success(max(cc.dt for cc in got), now)
+            else:
+                schedule.success(max(forecast.points[0].dt for forecast in got), now)
+            self.schedule_endpoint(endpoint)
+
+        weather, forecast = self.schedules['weather'], self.schedules['forecast']
+        places = len(self.places)
+        self.last_update.set_tooltip_text(
+            'Next update: current ' + datetime.fromtimestamp(weather.due).strftime('%H:%M')
+            + ', forecast ' + datetime.fromtimestamp(forecast.due).strftime('%H:%M')
+            + '\nRequests made: ' + str(weather.requests + forecast.requests)
+            + ', saved: ' + str(weather.saved(now, places) + forecast.saved(now, places)))
+
+    def show_snapshot(self):
+        """ Paint whatever was fetched last time straight away, marked as stale,
+            so the window isn't empty while the first refresh is running. False if
+            there was nothing """
+        place = self.places[self.place]
+        cc, forecast, fetched = cached(self.cache, place['lat'], place['lon'])
+        if cc is None and forecast is None:
+            return False
+        self.current = place['current'] = cc
+        self.forecast = place['forecast'] = forecast
+        place['updated'] = fetched
+        self.redraw()
+        self.grid.get_style_context().add_class('stale')
+        self.update_label(self.last_update, 'Saved: ' + datetime.fromtimestamp(fetched).strftime('%H:%M:%S') + '\n' + 'Updating...')
+        self.timing['snapshot'] = True
+        return True
 
-    @staticmethod
-    def get_wnd_dir(wnd_dir):
-        # Convert deg to bearing
-        if wnd_dir <= 11:
-            wnd_dir = 'N'
-        elif wnd_dir > 11 and wnd_dir <= 33:
-            wnd_dir = 'NNE'
-        elif wnd_dir > 33 and wnd_dir <= 56:
-            wnd_dir = 'NE'
-        elif wnd_dir > 56 and wnd_dir <= 78:
-            wnd_dir = 'ENE'
-        elif wnd_dir > 78 and wnd_dir <= 101:
-            wnd_dir = 'E'
-        elif wnd_dir > 101 and wnd_dir <= 123:
-            wnd_dir = 'ESE'
-        elif wnd_dir > 123 and wnd_dir <= 146:
-            wnd_dir = 'SE'
-        elif wnd_dir > 146 and wnd_dir <= 168:
-            wnd_dir = 'SSE'
-        elif wnd_dir > 168 and wnd_dir <= 190:
-            wnd_dir = 'S'
-        elif wnd_dir > 190 and wnd_dir <= 213:
-            wnd_dir = 'SSW'
-        elif wnd_dir > 213 and wnd_dir <= 235:
-            wnd_dir = 'SW'
-        elif wnd_dir > 235 and wnd_dir <= 258:
-            wnd_dir = 'WSW'
-        elif wnd_dir > 258 and wnd_dir <= 280:
-            wnd_dir = 'W'
-        elif wnd_dir > 280 and wnd_dir <= 303:
-            wnd_dir = 'WNW'
-        elif wnd_dir > 303 and wnd_dir <= 325:
-            wnd_dir = 'NW'
-        elif wnd_dir > 325 and wnd_dir <= 347:
-            wnd_dir = 'NNW'
-        elif wnd_dir > 347 and wnd_dir <= 360:
-            wnd_dir = 'N'
-        return wnd_dir
-
-    def the_loop(self):
-        """ The main display, refreshes every timeout minutes """
-        try:
-            # The data source
-            url_current = 'https://api.openweathermap.org/data/2.5/weather?lat=' + self.prefs_values['lat'] + '&lon=' + self.prefs_values['lon'] + '&units=metric&appid=' + self.prefs_values['appid']
-            data = urllib.request.urlopen(url_current)
-        except Exception as e:
-            print(e)
-#            error_box = Gtk.Label()
-#            self.main_container.pack_start(error_box, True, True, 0)
-#            error_box.set_markup('<span size=\"large\"><b>Error with connection</b></span>')
-            return True
-#        try:  # Remove previous grid if not just started
-        self.grid.destroy()
-#        except:
-#            pass
+    def first_draw(self, widget, cr):
+        self.timing['first_paint'] = time.monotonic() - STARTED
+        self.disconnect_by_func(self.first_draw)
+        self.report_timing()
+        return False
 
-        self.grid = Gtk.Grid()
+    @staticmethod
+    def trace_frames(window):
+        """ Layout and paint of each of window's frames as a trace span """
+        if not trace.enabled:
+            return
+
+        def realized(widget):
+            clock = widget.get_frame_clock()
+            clock.connect('before-paint', lambda clock: trace.begin('layout and paint', window=widget.get_title()))
+            clock.connect('after-paint', lambda clock: trace.end('layout and paint'))
+        window.connect('realize', realized)
+
+    def report_timing(self):
+        """ Print time to first paint and to fresh data once both are known,
+            if WEATHER_WIDGET_TIMING is set """
+        if not os.environ.get('WEATHER_WIDGET_TIMING') or 'first_paint' not in self.timing or 'fresh' not in self.timing:
+            return
+        print('startup: first paint %.0f ms%s, fresh data %.0f ms' % (
+            self.timing['first_paint'] * 1000, ' (from snapshot)' if self.timing.get('snapshot') else '',
+            self.timing['fresh'] * 1000))
+
+    def show_data(self, cc, forecast, cancel):
+        """ The main display, runs on the main loop once a refresh has finished.
+            If one endpoint failed the last data we had from it is shown instead """
+        if cancel.is_set():
+            return False
+        self.refresh_cancel = None
+        self.grid.get_style_context().remove_class('stale')
+        if 'fresh' not in self.timing:
+            self.timing['fresh'] = time.monotonic() - STARTED
+            self.report_timing()
+        if cc is not None:
+            self.current = cc
+        if forecast is not None:
+            self.forecast = forecast
+
+        if self.current is not None:
+            with trace.span('show current'):
+                self.show_current(self.current)
+        if self.forecast is not None:
+            with trace.span('show summary'):
+                self.show_summary()
+        self.five_days_changed()
+        return False
+
+    def build_grid(self):
+        """ Creates the main display once, refreshes only update what has changed """
         self.grid.set_column_homogeneous(True)
         self.grid.set_row_spacing(10)
         self.grid.set_column_spacing(5)
         self.main_container.add(self.grid)
+        self.icons_shown = {}  # Gtk.Image -> (icon set, icon, size) it shows
 
-        # Get current conditions
-        cc = json.load(data)
-
-        temp = cc['main']['temp']
-        feels_like = cc['main']['feels_like']
-        if self.prefs_values['temp_unit'] == 'F':
-            temp = (temp * 1.8) + 32
-            feels_like = (feels_like * 1.8) + 32
-        temp = str(round(temp, 1))
-        feels_like = str(round(feels_like, 1))
-        cond = cc['weather'][0]['description']
-        icon = cc['weather'][0]['icon']
-        wnd_spd = cc['wind']['speed']
-        wnd_spd = str(round(self.wnd_spd_unit(wnd_spd)))
-        try:
-            gust = cc['wind']['gust']
-            gust = '/' + str(round(self.wnd_spd_unit(gust)))
-        except KeyError:
-            gust = ''
-        wnd_dir = cc['wind']['deg']
-        pres = cc['main']['pressure']
-        humidity = cc['main']['humidity']
-
-        sunrise = cc['sys']['sunrise'] + cc['timezone']
-        sunset = cc['sys']['sunset'] + cc['timezone']
-        update = cc['dt'] + cc['timezone']
-        update = datetime.fromtimestamp(update)
-
-        wnd_dir = self.get_wnd_dir(wnd_dir)
-
-        # Create the boxes
+        # Current conditions
         vbox1 = Gtk.VBox(spacing=0)
         self.grid.attach(vbox1, 0, 0, 2, 1)
         vbox1.set_tooltip_text('Current conditions')
@@ -293,321 +778,160 @@ class Win(Gtk.Window):
 #        vbox3 = Gtk.VBox(spacing=0)
 #        self.grid.attach(vbox3, 5, 0, 2, 1)
 
-        city = Gtk.Label()
-        vbox1.pack_start(city, True, True, 0)
-        temperature = Gtk.Label()
-        vbox1.pack_start(temperature, True, True, 0)
-        temperature.set_margin_top(10)
-        current_cond = Gtk.Label()
-        vbox1.pack_start(current_cond, True, True, 0)
-        current_cond.set_margin_top(10)
-        weather_icon = Gtk.Image.new_from_pixbuf()
-        vbox1.pack_start(weather_icon, True, True, 0)
+        self.city = Gtk.Label()
+        vbox1.pack_start(self.city, True, True, 0)
+        self.city.set_halign(Gtk.Align.START)
+        self.city.set_line_wrap(True)
+        self.temperature = Gtk.Label()
+        vbox1.pack_start(self.temperature, True, True, 0)
+        self.temperature.set_margin_top(10)
+        self.temperature.set_halign(Gtk.Align.START)
+        self.current_cond = Gtk.Label()
+        vbox1.pack_start(self.current_cond, True, True, 0)
+        self.current_cond.set_margin_top(10)
+        self.current_cond.set_line_wrap(True)
+        self.current_cond.set_halign(Gtk.Align.START)
+        self.weather_icon = Gtk.Image.new_from_pixbuf()
+        vbox1.pack_start(self.weather_icon, True, True, 0)
+        self.weather_icon.set_halign(Gtk.Align.START)
         wnd_box = Gtk.HBox()
         vbox2.pack_start(wnd_box, True, True, 0)
-        wnd_speed = Gtk.Label()
-        wnd_box.pack_start(wnd_speed, True, True, 0)
+        self.wnd_speed = Gtk.Label()
+        wnd_box.pack_start(self.wnd_speed, True, True, 0)
+        self.wnd_speed.set_halign(Gtk.Align.START)
 #        wnd_dir_icon = Gtk.Image.new_from_pixbuf()
 ##        vbox3.pack_start(wnd_dir_icon, True, True, 0)
 #        wnd_dir_icon.set_valign(Gtk.Align.START)
-        pressure = Gtk.Label()
-        vbox2.pack_start(pressure, True, True, 0)
-        hum = Gtk.Label()
-        vbox2.pack_start(hum, True, True, 0)
-        sun_set = Gtk.Label()
-        vbox2.pack_start(sun_set, True, True, 0)
-        last_update = Gtk.Label()
-        vbox2.pack_start(last_update, True, True, 0)
-
-        # Print data
-        city.set_markup('<span size=\"large\"><b>' + self.prefs_values['loc'] + '</b></span>')
-        city.set_halign(Gtk.Align.START)
-        city.set_line_wrap(True)
-
-        temperature.set_markup(
-            '<span size=\"xx-large\"><b>' + temp + u'\N{DEGREE SIGN}' + self.prefs_values['temp_unit'] + '</b></span> ' + 'f/l ' + feels_like + u'\N{DEGREE SIGN}' + self.prefs_values['temp_unit'])
-        temperature.set_halign(Gtk.Align.START)
-
-        current_cond.set_markup('<span variant=\"smallcaps\">' + cond + '</span>')
-        current_cond.set_line_wrap(True)
-
-        current_cond.set_halign(Gtk.Align.START)
-
-        weathericon = self.path + os.sep + 'PNG' + os.sep + icon + '.png'
-        pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_size(weathericon, 70, 70)
-        weather_icon.set_from_pixbuf(pixbuf)
-        weather_icon.set_halign(Gtk.Align.START)
-
-        wnd_speed.set_text('Wind: ' + wnd_spd + gust + ' ' + self.prefs_values['speed_unit'] + ' ' + wnd_dir)
-        wnd_speed.set_halign(Gtk.Align.START)
-
-#        wnd_icon = self.path + os.sep + 'bearingicons' + os.sep + wnd_dir + '.png'
-#        pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_size(wnd_icon, 60, 60)
-#        wnd_dir_icon.set_from_pixbuf(pixbuf)
 #        wnd_dir_icon.set_tooltip_text('Wind direction')
-
-        pressure.set_text('Pressure: ' + str(pres) + ' mb')
-        pressure.set_halign(Gtk.Align.START)
-
-        hum.set_text('Humidity: ' + str(humidity) + '%')
-        hum.set_halign(Gtk.Align.START)
-
-        sunrisetime = datetime.fromtimestamp(sunrise)
-        sunset = datetime.fromtimestamp(sunset)
-        sun_set.set_text(
-            'Sunrise: ' + sunrisetime.time().strftime('%H:%M') + '\n' + 'Sunset:  ' + sunset.time().strftime('%H:%M'))
-        sun_set.set_halign(Gtk.Align.START)
-
-        last_update.set_text('Updated: ' + datetime.now().strftime('%H:%M:%S') + '\n' + 'On server: ' + update.time().strftime('%H:%M:%S'))
-        last_update.set_halign(Gtk.Align.START)
-
-        # brief 5 day forecast
-        url_forecast = 'http://api.openweathermap.org/data/2.5/forecast?lat=' + self.prefs_values['lat'] + '&lon=' + self.prefs_values['lon'] + '&units=metric&appid=' + self.prefs_values['appid']
-        forecast = urllib.request.urlopen(url_forecast)
-        self.forecast = json.load(forecast)
-
-        wt2 = []
-        for data in self.forecast['list']:
-                temp = round(data['main']['temp'])
-                dt = datetime.utcfromtimestamp(data['dt']+self.forecast['city']['timezone'])
-                _day = dt.strftime('%a')
-                _date = dt.strftime('%d.%m')
-                _time = dt.strftime('%H:%M')
-                icon = data['weather'][0]['icon']+'.png'
-                text = data['weather'][0]['description']
-                wind_speed = round(data['wind']['speed'])
-                wind_direct = data['wind']['deg']
-                wind_gust = round(data['wind']['gust'])
-                pres = data['main']['pressure']
-                try:
-                        rain = data['rain']['3h']
-                except KeyError:
-                        rain = 0
-                chance_rain = data['pop']
-
-                wt2.append({
-                        't':temp,
-                        'day': _day,
-                        'date': _date,
-                        'time': _time,
-                        'icon': icon,
-                        'text': text,
-                        'wind_speed': wind_speed,
-                        'wind_direct': wind_direct,
-                        'wind_gust': wind_gust,
-                        'rain': rain,
-                        'pop': chance_rain,
-                        'pres': pres
-                        })
-
-        wt = [[]]
-        i = 0
-        _date = dt.strftime('%d')
-        # true sort by date for local time
-        for item in wt2:
-                if _date != item['date']:
-                        i+=1
-                        wt.append([])
-                        _date = item['date']
-                wt[i].append(item)
-
-        t_day = []
-        t_night = []
-        day = []
-        img = []
-        text = []
-        wind_speed = []
-        gust = []
-        wind_direct = []
-        rain = []
-        pop = []
-        average_pres = []
-
-        for i in range(1, len(wt)):
-                max_t = None
-                min_t = None
-                w_s = 0
-                g = None
-                r = 0
-                max_pop = None
-                p = 0
-                # find max min temp
-
-                for item in wt[i]:
-                        if max_t is None:
-                                max_t = item['t']
-                                min_t = item['t']
-                        elif item['t'] > max_t:
-                                max_t = item['t']
-                        elif item['t'] < min_t:
-                                min_t = item['t']
-
-                        # find average wind speed
-                        w_s += item['wind_speed']
-                        # find average pressure
-                        p += item['pres']
-                        # find rain
-                        r += item['rain']
-
-                        try:
-                                #find max chance rain
-                                if max_pop is None:
-                                        max_pop = item['pop']
-#                                        min_pop = item['pop']
-                                if item['pop'] > max_pop:
-                                        max_pop = item['pop']
-
-                        except KeyError:
-                                max_pop = 0
-
-                        try:
-                                # find max wind gust
-                                if g is None:
-                                        g = item['wind_gust']
-#                                        min_g = item['wind_gust']
-                                if int(item['wind_gust']) > int(g):
-                                        g = item['wind_gust']
-                        except KeyError:
-                                g = 0
-
-                t_day.append(str(round(self.temp_convert(float(max_t)))))
-                t_night.append(str(round(self.temp_convert(float(min_t)))))
-                day.append(wt[i][0]['day'])
-                index = -1 if len(wt[i]) < 5 else 4 # pick 22h today or 13h
-                img.append(wt[i][index]['icon'])
-                text.append(wt[i][index]['text'])
-                wind_speed.append(str(round(self.wnd_spd_unit(w_s/len(wt[i])))))
-                gust.append(str(round(self.wnd_spd_unit(g))))
-                wind_direct.append(wt[i][index]['wind_direct'])
-                rain.append(r)
-                pop.append(max_pop)
-                average_pres.append(str(round(p/len(wt[i]))))
-
+        self.pressure = Gtk.Label()
+        vbox2.pack_start(self.pressure, True, True, 0)
+        self.pressure.set_halign(Gtk.Align.START)
+        self.hum = Gtk.Label()
+        vbox2.pack_start(self.hum, True, True, 0)
+        self.hum.set_halign(Gtk.Align.START)
+        self.sun_set = Gtk.Label()
+        vbox2.pack_start(self.sun_set, True, True, 0)
+        self.sun_set.set_halign(Gtk.Align.START)
+        self.last_update = Gtk.Label()
+        vbox2.pack_start(self.last_update, True, True, 0)
+        self.last_update.set_halign(Gtk.Align.START)
+
+        # brief 5 day forecast, one column per day
+        self.day_columns = []
+        tooltips = [('day', None), ('min_max', 'Max / min temp'), ('icon', None),
+                    ('wind', 'Average wind speed / max gust'), ('wnd_dir', 'Wind direction'),
+                    ('pop', 'Chance of rain'), ('rain', 'Total amount of rain'), ('pres', 'Pressure')]
         for i in range(0, 5):
             vbox = Gtk.VBox()
             self.grid.attach(vbox, i, 1, 1, 1)
-
-            forecast_time = Gtk.Label()
-            vbox.pack_start(forecast_time, True, True, 0)
-            forecast_time.set_text(day[i])
-            forecast_time.set_halign(Gtk.Align.START)
-
-            min_max = Gtk.Label()
-            vbox.pack_start(min_max, True, True, 0)
-            min_max.set_text(t_day[i] + '/' + t_night[i] + u'\N{DEGREE SIGN}' + 'C')
-            min_max.set_tooltip_text('Max / min temp')
-            min_max.set_halign(Gtk.Align.START)
-
-            symbol = img[i]
-            weathericon = self.path + os.sep + 'PNG' + os.sep + symbol
-            icon = Gtk.Image.new_from_pixbuf()
-            vbox.pack_start(icon, True, True, 0)
-            pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_size(weathericon, 30, 30)
-            icon.set_from_pixbuf(pixbuf)
-            icon.set_tooltip_markup('<span variant=\"smallcaps\">' + text[i] + '</span>')
-            icon.set_halign(Gtk.Align.START)
-
-            wnd_spd = str(round(float(wind_speed[i])))
-            try:
-                wnd_gust = '/' + gust[i]
-            except KeyError:
-                wnd_gust = ''
-            wind = Gtk.Label()
-            vbox.pack_start(wind, True, True, 0)
-            wind.set_text(str(wnd_spd) + wnd_gust + ' ' + self.prefs_values['speed_unit'])
-            wind.set_tooltip_text('Average wind speed / max gust')
-            wind.set_halign(Gtk.Align.START)
-
-            wnd_dir = self.get_wnd_dir(wind_direct[i])
-            wnddir = Gtk.Label()
-            vbox.pack_start(wnddir, True, True, 0)
-            wnddir.set_text(str(wnd_dir))
-            wnddir.set_tooltip_text('Wind direction')
-            wnddir.set_halign(Gtk.Align.START)
-
-#            humidity = fc[i]['humidity']
-#            hum = Gtk.Label()
-#            vbox.pack_start(hum, True, True, 0)
-#            hum.set_text('H ' + str(humidity) + '%')
-#            hum.set_tooltip_text('Humidity')
-#            hum.set_halign(Gtk.Align.START)
-
-            prec = pop[i]
-            precipitation = Gtk.Label()
-            vbox.pack_start(precipitation, True, True, 0)
-            precipitation.set_text(str(round(prec * 100)) + '%')
-            precipitation.set_tooltip_text('Chance of rain')
-            precipitation.set_halign(Gtk.Align.START)
-
-            try:
-                r = rain[i]
-                r = round(r, 1)
-            except KeyError:
-                r = '0'
-            rainfall = Gtk.Label()
-            vbox.pack_start(rainfall, True, True, 0)
-            rainfall.set_text(str(r) + ' mm')
-            rainfall.set_tooltip_text('Total amount of rain')
-            rainfall.set_halign(Gtk.Align.START)
-
-            pres = average_pres[i]
-            pressure = Gtk.Label()
-            vbox.pack_start(pressure, True, True, 0)
-            pressure.set_text(str(pres) + ' mb')
-            pressure.set_tooltip_text('Pressure')
-            pressure.set_halign(Gtk.Align.START)
-
-        self.grid.show_all()
-        return True
-
-    @staticmethod
-    def temp_colour(temp):
-        """ Selects font colour based on temperature """
-        if temp <= 0:
-            temp_colour = '#00ffff'
-        elif temp > 0 and temp < 5:
-            temp_colour = '#3399ff'
-        elif temp >= 5 and temp < 10:
-            temp_colour = '#3366cc'
-        elif temp >= 10 and temp < 15:
-            temp_colour = '#3319FF'
-        elif temp >= 15 and temp < 20:
-            temp_colour = '#ff3300'
-        elif temp >= 20 and temp < 25:
-            temp_colour = '#ff0000'
-        elif temp >= 25:
-            temp_colour = '#993300'
-        return temp_colour
-
-    @staticmethod
-    def cloud_colour(cloud):
-        """ Selects BG colour based on amount of cloud """
-        if cloud >= 0 and cloud < 20:
-            cloud_bg = '#eeeeee'
-        elif cloud >= 20 and cloud < 40:
-            cloud_bg = '#dddddd'
-        elif cloud >= 40 and cloud < 60:
-            cloud_bg = '#cccccc'
-        elif cloud >= 60 and cloud < 80:
-            cloud_bg = '#bbbbbb'
-        elif cloud >= 80:
-            cloud_bg = '#aaaaaa'
-        return cloud_bg
+            column = {}
+            for name, tooltip in tooltips:
+                widget = Gtk.Image.new_from_pixbuf() if name == 'icon' else Gtk.Label()
+                vbox.pack_start(widget, True, True, 0)
+                widget.set_halign(Gtk.Align.START)
+                if tooltip:
+                    widget.set_tooltip_text(tooltip)
+                column[name] = widget
+            self.day_columns.append(column)
+
+        self.chart = ForecastChart(80)
+        self.grid.attach(self.chart, 0, 2, 5, 1)
+        self.chart.set_tooltip_text('Temperature, rain, chance of rain and gusts, 3 hourly')
 
     @staticmethod
-    def wind_colour(wnd_spd):
-        """ Selects font colour based on wind speed """
-        if wnd_spd < 8:
-            wnd_colour = '#2E423B'
-        if wnd_spd >= 8 and wnd_spd < 15:
-            wnd_colour = '#CE5C00'
-        elif wnd_spd >= 15 and wnd_spd < 20:
-            wnd_colour = '#CE1600'
-        elif wnd_spd >= 20 and wnd_spd < 25:
-            wnd_colour = '#CC0000'
-        elif wnd_spd >= 25:
-            wnd_colour = '#A40075'
-        return wnd_colour
+    def update_label(label, text, markup=False):
+        """ Only touch a label if its content has changed """
+        if label.get_label() != text:
+            if markup:
+                label.set_markup(text)
+            else:
+                label.set_text(text)
+
+    def update_icon(self, image, icon, size, icon_set='PNG'):
+        """ Only set a new pixbuf if the icon has changed """
+        key = (icon_set, icon, size)
+        if self.icons_shown.get(image) != key:
+            image.set_from_pixbuf(self.icons.get(icon, size, icon_set))
+            self.icons_shown[image] = key
+
+    def clear_icon(self, image):
+        if self.icons_shown.pop(image, None) is not None:
+            image.clear()
+
+    def show_current(self, cc):
+        """ Current conditions, top half of the grid """
+        view = present.current(cc, self.prefs_values['temp_unit'], self.prefs_values['speed_unit'])
+        self.update_label(self.city, '<span size=\"large\"><b>' + escape(self.places[self.place]['loc']) + '</b></span>', True)
+        self.update_label(self.temperature, view.temperature_markup, True)
+        self.update_label(self.current_cond, view.description_markup, True)
+        self.update_icon(self.weather_icon, view.icon, 70)
+        self.update_label(self.wnd_speed, view.wind)
+
+#        self.update_icon(wnd_dir_icon, wnd_dir, 60, 'bearingicons')
+
+        self.update_label(self.pressure, view.pressure)
+        self.show_tendency()
+        self.update_label(self.hum, view.humidity)
+        self.update_label(self.sun_set, view.sun)
+        updated = self.places[self.place]['updated']  # when it came, not when it was last drawn
+        self.update_label(self.last_update, ('Updated: ' + datetime.fromtimestamp(updated).strftime('%H:%M:%S')
+                                             if updated is not None else '') + '\n' + view.server_time)
+
+    def clear_current(self):
+        """ Top half of the grid for a place with no current conditions yet: only its name """
+        self.update_label(self.city, '<span size=\"large\"><b>' + escape(self.places[self.place]['loc']) + '</b></span>', True)
+        for label in (self.temperature, self.current_cond, self.wnd_speed, self.pressure, self.hum, self.sun_set,
+                      self.last_update):
+            self.update_label(label, '')
+        self.clear_icon(self.weather_icon)
+        self.pressure.set_tooltip_text(None)
+
+    def show_tendency(self):
+        """ Pressure tendency over the last 3 hours, from the history, as the pressure tooltip """
+        place = self.places[self.place]
+        try:
+            change = self.history.tendency(place['lat'], place['lon'])
+        except sqlite3.Error as e:
+            print(e)
+            change = None
+        if change is None:
+            text = None
+        elif abs(change) < 0.5:
+            text = 'Steady over the last 3 hours'
+        else:
+            text = ('Rising ' if change > 0 else 'Falling ') + str(round(abs(change), 1)) + ' mb in the last 3 hours'
+        if self.pressure.get_tooltip_text() != text:
+            self.pressure.set_tooltip_text(text)
+
+    def show_summary(self):
+        """ brief 5 day forecast, bottom half of the grid """
+        views = present.summary(self.forecast, self.prefs_values['temp_unit'], self.prefs_values['speed_unit'])
+        self.chart.set_forecast(self.forecast, self.prefs_values['temp_unit'], self.palette)
+        for column, view in zip(self.day_columns, views):
+            self.update_label(column['day'], view.day)
+            self.update_label(column['min_max'], view.min_max)
+            self.update_icon(column['icon'], view.icon, 30)
+            if column['icon'].get_tooltip_markup() != view.tooltip_markup:
+                column['icon'].set_tooltip_markup(view.tooltip_markup)
+            self.update_label(column['wind'], view.wind)
+            self.update_label(column['wnd_dir'], view.wind_dir)
+
+#            self.update_label(column['hum'], 'H ' + str(point.humidity) + '%')
+
+            self.update_label(column['pop'], view.pop)
+            self.update_label(column['rain'], view.rain)
+            self.update_label(column['pres'], view.pressure)
+
+    def clear_summary(self):
+        """ Bottom half of the grid for a place with no forecast yet """
+        self.chart.set_forecast(None, self.prefs_values['temp_unit'], self.palette)
+        for column in self.day_columns:
+            for name, widget in column.items():
+                if name == 'icon':
+                    self.clear_icon(widget)
+                    widget.set_tooltip_markup(None)
+                else:
+                    self.update_label(widget, '')
 
     @staticmethod
     def day_night(sr, ss, h):
@@ -620,272 +944,200 @@ class Win(Gtk.Window):
         return dn
 
     def five_days(self, pos):
-        """ Opens window with 5 day forecast """
+        """ Shows the window with the 5 day forecast, built the first time. Closing it
+            only hides it """
+        trace.begin('five_days')
+        if self.five_day_win is None:
+            self.build_five_days()
+        self.update_five_days()
+        self.five_day_win.move(pos[0], pos[1])
+        self.five_day_win.present()
+        trace.end('five_days')
+
+    def five_days_changed(self):
+        """ The forecast, units or look changed. An open 5 day window follows at once,
+            a hidden one when it is next opened. With no forecast, as for a place
+            not fetched yet, it is hidden, as call_five_day wouldn't open it """
+        if self.five_day_win is not None and self.five_day_win.get_visible():
+            if self.forecast is None:
+                self.five_day_win.hide()
+            else:
+                self.update_five_days()
 
-        # CSS
-        screen = Gdk.Screen.get_default()
-        provider = Gtk.CssProvider()
-        css = b"""
-        label.day,image.day {
-        padding: 0 3px 0 3px;
-        min-height: 30px;
-        border-bottom: 1px solid #bbbbbb;
-        background: #eeeeee;
-        color: #191919;
-        }
-        label.night, image.night {
-        padding: 0 3px 0 3px;
-        min-height: 30px;
-        border-bottom: 1px solid #bbbbbb;
-        background: #bbbbbb;
-        color: #191919;
-        }
-        """
-        provider.load_from_data(css)
-        Gtk.StyleContext.add_provider_for_screen(screen, provider, Gtk.STYLE_PROVIDER_PRIORITY_APPLICATION)
-
-        # Create window
+    def build_five_days(self):
+        """ The 5 day window. The table is a TreeView over a ListStore, so only rows on
+            screen are drawn and there are no widgets per row """
         five_day_win = Gtk.Window()
         five_day_win.set_title('5 day 3 hour forecast')
-        five_day_win.set_default_size(450, 500)
-        five_day_win.move(pos[0], pos[1])
+        five_day_win.set_default_size(450, 650)
+        five_day_win.connect('delete-event', lambda window, event: window.hide_on_delete())
 
+        box = Gtk.VBox()
+        five_day_win.add(box)
+        self.five_day_chart = ForecastChart(140)
+        self.five_day_chart.set_margin_start(10)
+        self.five_day_chart.set_margin_end(10)
+        self.five_day_chart.set_margin_top(10)
+        box.pack_start(self.five_day_chart, False, False, 0)
         container = Gtk.ScrolledWindow()
+        container.set_border_width(10)
         # container.set_policy (Gtk.PolicyType.NEVER,Gtk.PolicyType.AUTOMATIC)
-
-        five_day_win.add(container)
-        flowbox = Gtk.VBox()
-        flowbox.set_border_width(10)
-        container.add(flowbox)
-
-        grid = Gtk.Grid()
-        grid.set_row_spacing(1)
-        flowbox.add(grid)
-
-        sunrise = self.forecast['city']['sunrise'] + self.forecast['city']['timezone']
-        sunset = self.forecast['city']['sunset'] + self.forecast['city']['timezone']
-        sunrisetime = datetime.fromtimestamp(sunrise)
-        sunrise = sunrisetime.time().strftime('%H:%M')
-        sunsettime = datetime.fromtimestamp(sunset)
-        sunset = sunsettime.time().strftime('%H:%M')
-
-        top = ['Time', 'Temp', '    ', '    ', 'Rain', 'Wind', '', 'Cloud', 'Pres']
-        f = 0
-        for item in top:
-            item_label = Gtk.Label()
-            grid.attach(item_label, f, 0, 1, 1)
-            item_label.set_markup('<b>' + item + '</b>')
-            item_label.set_halign(Gtk.Align.START)
-            f = f + 1
-
-        for i in range(0, 40):
-            t = self.forecast['list'][i]['dt']
-            t = datetime.fromtimestamp(t)
-            d = t.strftime('%a')
-            t = t.time().strftime('%H')
-
-            dn = self.day_night_5day(sunrise, sunset, t)
-
-            day_label = Gtk.Label()
-            grid.attach(day_label, 0, i + 1, 1, 1)
-            if dn == '-n':
-                context = day_label.get_style_context()
-                context.add_class('night')
-            else:
-                context = day_label.get_style_context()
-                context.add_class('day')
-
-            day_label.set_markup('<b>' + d + ' ' + t + 'h</b>')
-
-            temp = self.forecast['list'][i]['main']['temp']
-            temp_colour = self.temp_colour(temp)  # Colour coded text
-            if self.prefs_values['temp_unit'] == 'F':
-                temp = (temp * 1.8) + 32
-            temp = round(temp, 1)
-            temp_label = Gtk.Label()
-            grid.attach(temp_label, 1, i + 1, 1, 1)
-
-            if dn == '-n':
-                context = temp_label.get_style_context()
-                context.add_class('night')
-            else:
-                context = temp_label.get_style_context()
-                context.add_class('day')
-
-            temp_label.set_markup('<b><span foreground=\"' + temp_colour + '\">' + str(temp) + u'\N{DEGREE SIGN}' + 'C</span></b>')
-
-            symbol = self.forecast['list'][i]['weather'][0]['icon']
-            weather_icon = self.path + os.sep + 'PNG' + os.sep + symbol + '.png'
-            weathericon = Gtk.Image.new_from_pixbuf()
-            grid.attach(weathericon, 2, i + 1, 1, 1)
-            if dn == '-n':
-                context = weathericon.get_style_context()
-                context.add_class('night')
-            else:
-                context = weathericon.get_style_context()
-                context.add_class('day')
-
-            pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_size(weather_icon, 20, 20)
-            weathericon.set_from_pixbuf(pixbuf)
-            weathericon.show()
-
-            name = self.forecast['list'][i]['weather'][0]['description']
-            name_label = Gtk.Label()
-            grid.attach(name_label, 3, i + 1, 1, 1)
-            if dn == '-n':
-                context = name_label.get_style_context()
-                context.add_class('night')
-            else:
-                context = name_label.get_style_context()
-                context.add_class('day')
-
-            name_label.set_markup('<span variant=\"smallcaps\">' + name + '</span>')
-            name_label.set_line_wrap(True)
-
-            try:
-                prec = self.forecast['list'][i]['rain']['3h']
-            except KeyError:
-                prec = 0
-
-            prec = round(float(prec), 1)
-            precipitation = Gtk.Label()
-            grid.attach(precipitation, 4, i + 1, 1, 1)
-            if dn == '-n':
-                context = precipitation.get_style_context()
-                context.add_class('night')
-            else:
-                context = precipitation.get_style_context()
-                context.add_class('day')
-            if prec > 0:
-                precipitation.set_markup('<b>' + str(prec) + ' mm</b>')
-            else:
-                precipitation.set_text(str(prec) + ' mm')
-
-            wnd_spd = self.forecast['list'][i]['wind']['speed']
-            wnd_colour = self.wind_colour(wnd_spd)
-            wnd_spd = round(self.wnd_spd_unit(wnd_spd))
-            wnd_spd_label = Gtk.Label()
-            try:
-                wnd_gust = self.forecast['list'][i]['wind']['gust']
-                gust_colour = self.wind_colour(wnd_gust)
-                wnd_gust = '/' + str(round(self.wnd_spd_unit(wnd_gust)))
-            except KeyError:
-                gust_colour = '#2E423B'
-                wnd_gust = ''
-            grid.attach(wnd_spd_label, 5, i + 1, 1, 1)
-            if dn == '-n':
-                context = wnd_spd_label.get_style_context()
-                context.add_class('night')
-            else:
-                context = wnd_spd_label.get_style_context()
-                context.add_class('day')
-
-            wnd_spd_label.set_markup('<span foreground=\"' + wnd_colour + '\">' + str(
-                wnd_spd) + '</span><span foreground=\"' + gust_colour + '\">' + wnd_gust + self.prefs_values['speed_unit'] + '</span>')
-
-            wnd_dir = self.get_wnd_dir(self.forecast['list'][i]['wind']['deg'])
-            wnd_dir_label = Gtk.Label()
-            grid.attach(wnd_dir_label, 6, i + 1, 1, 1)
-            if dn == '-n':
-                context = wnd_dir_label.get_style_context()
-                context.add_class('night')
+        box.pack_start(container, True, True, 0)
+
+        # time, temp, icon, description, rain, wind, wind dir, cloud, pressure, row background
+        self.five_day_store = Gtk.ListStore(str, str, GdkPixbuf.Pixbuf, str, str, str, str, str, str, str)
+        treeview = Gtk.TreeView(model=self.five_day_store)
+        treeview.get_selection().set_mode(Gtk.SelectionMode.NONE)
+        treeview.set_has_tooltip(True)
+        treeview.connect('query-tooltip', self.five_day_tooltip)
+
+        # Fixed sizes let the TreeView skip measuring every row
+        treeview.set_fixed_height_mode(True)
+        top = [('Time', 6), ('Temp', 5), ('    ', 2), ('    ', 10), ('Rain', 5), ('Wind', 7), ('', 3), ('Cloud', 4), ('Pres', 6)]
+        self.five_day_columns = []  # (column, width in characters, text renderer or None)
+        for index, (title, chars) in enumerate(top):
+            if index == 2:
+                renderer = Gtk.CellRendererPixbuf()
+                column = Gtk.TreeViewColumn(title, renderer, pixbuf=index, cell_background=9)
             else:
-                context = wnd_dir_label.get_style_context()
-                context.add_class('day')
-
-            wnd_dir_label.set_text(str(wnd_dir))
-
-            cloud = self.forecast['list'][i]['clouds']['all']
-            cloud_label = Gtk.Label()
-            grid.attach(cloud_label, 7, i + 1, 1, 1)
-            cloud_bg = self.cloud_colour(cloud)
-            if dn == '-n':
-                context = cloud_label.get_style_context()
-                context.add_class('night')
-                cloud_label.set_markup(str(cloud) + '%')
-            else:
-                context = cloud_label.get_style_context()
-                context.add_class('day')
-                cloud_label.set_markup('<span background=\"' + cloud_bg + '\">' + str(cloud) + '%</span>')
-
-            pres = self.forecast['list'][i]['main']['pressure']
-            pressure = Gtk.Label()
-            grid.attach(pressure, 8, i + 1, 1, 1)
-            if dn == '-n':
-                context = pressure.get_style_context()
-                context.add_class('night')
+                renderer = Gtk.CellRendererText(ellipsize=Pango.EllipsizeMode.END)
+                column = Gtk.TreeViewColumn(title, renderer, markup=index, cell_background=9)
+            renderer.set_padding(3, 0)
+            renderer.set_fixed_size(-1, 30)
+            column.set_sizing(Gtk.TreeViewColumnSizing.FIXED)
+            column.set_resizable(True)
+            treeview.append_column(column)
+            self.five_day_columns.append((column, chars, renderer if index != 2 else None))
+        container.add(treeview)
+        box.show_all()
+
+        self.trace_frames(five_day_win)
+        self.five_day_win = five_day_win
+
+    def update_five_days(self):
+        """ Bring the 5 day table up to date with the data, units, theme and font size,
+            changing only the rows that differ """
+        if self.five_day_win is None or self.forecast is None:
+            return
+        shown = (self.forecast, self.prefs_values['temp_unit'], self.prefs_values['speed_unit'], self.palette,
+                 self.prefs_values['font_size'])
+        if shown == self.five_day_shown:
+            return
+        self.five_day_chart.set_forecast(self.forecast, shown[1], self.palette)
+        if shown[3:] != self.five_day_shown[3:]:
+            char_width = int(self.prefs_values['font_size'])
+            for column, chars, renderer in self.five_day_columns:
+                column.set_fixed_width(chars * char_width)
+                if renderer is not None:
+                    renderer.set_property('foreground', self.palette.table_text)
+
+        trace.begin('rows', points=len(self.forecast.points))
+        rows = present.table(self.forecast, shown[1], shown[2], self.palette)
+        store = self.five_day_store
+        if len(store) != len(rows):
+            store.clear()
+            self.five_day_rows = []
+        for i, row in enumerate(rows):
+            if i < len(self.five_day_rows):
+                if self.five_day_rows[i] != row:
+                    store[i] = row[:2] + (self.icons.get(row[2], 20),) + row[3:]
             else:
-                context = pressure.get_style_context()
-                context.add_class('day')
-
-            pressure.set_text(str(pres) + ' mb')
-
-        five_day_win.connect("destroy", Gtk.main_quit)
-        five_day_win.show_all()
-        Gtk.main()
-
-    @staticmethod
-    def day_night_5day(sr, ss, h):
-        if sr <= h and h <= ss:
-            dn = '-d'
-        else:
-            dn = '-n'
-        return dn
+                store.append(row[:2] + (self.icons.get(row[2], 20),) + row[3:])
+        trace.end('rows')
+        self.five_day_rows = rows
+        self.five_day_shown = shown
+
+    def five_day_tooltip(self, treeview, x, y, keyboard, tooltip):
+        """ Details for the row under the pointer, only worked out when GTK asks for them """
+        found, x, y, store, path, treeiter = treeview.get_tooltip_context(x, y, keyboard)
+        if not found:
+            return False
+        point = self.five_day_shown[0].points[path.get_indices()[0]]
+        tooltip.set_text(present.table_tooltip(point, self.prefs_values['temp_unit']))
+        treeview.set_tooltip_row(tooltip, path)
+        return True
 
     def rainfall_radar(self):
-        """ Brings up rainfall radar window """
-        # Create window
-        rain_win = Gtk.Window()
-        rain_win.set_default_size(900, 700)
-
-        # Create view for webpage
-        viewport = Gtk.ScrolledWindow()
-        webview = WebKit2.WebView()
-        webview.load_uri('file://' + self.path + os.sep + 'radar.html?lat=' + self.prefs_values['lat'] + '&lon=' + self.prefs_values['lon'])
-        viewport.add(webview)
-        # Add everything and initialize
-        container = Gtk.VBox()
-        container.pack_start(viewport,True,True,0)
-        rain_win.add(container)
-
-        rain_win.connect("destroy", Gtk.main_quit)
-        rain_win.show_all()
-        Gtk.main()
+        """ Brings up the rainfall radar for the place on show, built the first time.
+            Tiles have their own pool so they don't hold up a refresh """
+        if self.radar_win is None:
+            self.radar_pool = ThreadPoolExecutor(max_workers=4)
+            tiles = TileCache(self.path + os.sep + 'tiles', self.transport)
+            rain_win = Gtk.Window()
+            rain_win.set_title('Rainfall radar')
+            rain_win.set_default_size(600, 600)
+            rain_win.connect('delete-event', lambda window, event: window.hide_on_delete())
+            self.radar_view = RadarView(Radar(tiles, self.radar_pool))
+            rain_win.add(self.radar_view)
+            self.radar_view.show()
+            self.trace_frames(rain_win)
+            self.radar_win = rain_win
+        place = self.places[self.place]
+        self.radar_win.present()
+        self.radar_view.show_place(float(place['lat']), float(place['lon']))
 
     def prefs(self, pos):
-        """ Saves and stores preferences """
-        from urllib.parse import quote
-
-        def geo_search(self):
-            """ Shows up to 5 location search results """
-#            try:
+        """ Shows the preferences window, built the first time, with the current values """
+        trace.begin('prefs')
+        self.prefs_pos = pos
+        if self.prefs_win is None:
+            self.prefs_win, self.prefs_fill = self.build_prefs()
+        self.prefs_fill()
+        self.prefs_win.present()
+        trace.end('prefs')
+
+    def build_prefs(self):
+        """ Saves and stores preferences. Returns the window and a function that sets its
+            fields from prefs_values """
+        search = {'timer': None, 'cancel': None}  # pending debounce timer, in-flight lookup
+
+        def search_changed(widget):
+            """ Search as you type, once typing has paused """
+            if search['timer'] is not None:
+                GLib.source_remove(search['timer'])
+            search['timer'] = GLib.timeout_add(500, geo_search, None)
+
+        def geo_search(widget):
+            """ Shows up to 5 location search results. The lookup runs in a thread,
+                starting a new one abandons the last """
+            if search['timer'] is not None and widget is not None:
+                GLib.source_remove(search['timer'])
+            search['timer'] = None
+            if search['cancel'] is not None:
+                search['cancel'].set()
+            geosearch = geosearch_input.get_text().strip()
+            if len(geosearch) < 3:
+                return False
+            cancel = search['cancel'] = threading.Event()
+            threading.Thread(target=run_search, args=(geosearch, cancel), daemon=True).start()
+            return False
+
+        def run_search(geosearch, cancel):
+            try:
+                with trace.span('place search', query=geosearch):
+                    results = self.geosearch.search(geosearch, cancel)
+            except Exception as e:
+                print(e)
+                return
+            if results is not None and not cancel.is_set():
+                GLib.idle_add(show_results, results, cancel)
+
+        def show_results(results, cancel):
+            if cancel.is_set():
+                return False
             store.clear()
-#            except:
-#                pass
-
-            geosearch = geosearch_input.get_text()
-
-            search_url = 'https://nominatim.openstreetmap.org/?format=json&addressdetails=1&q=' + quote(
-                geosearch) + '&limit=5'
-
-            location = urllib.request.urlopen(search_url)
-            location = json.load(location)
-
-            for i in range(len(location)):
-                try:
-                    try:
-                        loc = location[i]['address']['city']
-                    except KeyError:
-                        loc = location[i]['address']['town']
-                except KeyError:
-                    try:
-                        loc = location[i]['address']['village']
-                    except KeyError:
-                        loc = 'Unknown'
-
-                store.append([location[i]['display_name'], loc, location[i]['lat'], location[i]['lon'], i])
-
+            for i, (display_name, loc, lat, lon) in enumerate(results):
+                store.append([display_name, loc, lat, lon, i])
             treeview.show_all()
+            return False
+
+        def stop_search(widget):
+            if search['timer'] is not None:
+                GLib.source_remove(search['timer'])
+                search['timer'] = None
+            if search['cancel'] is not None:
+                search['cancel'].set()
+                search['cancel'] = None
 
         def save_and_reload(button, self):
             select = treeview.get_selection()
@@ -906,18 +1158,39 @@ class Win(Gtk.Window):
             if int(timeout) < 10: timeout = '10'
             font_size = font.get_value_as_int()
 
-            with open(self.path + os.sep + 'prefs', 'w') as f:
-                f.write('appid,' + appid_value + '\n')
-                f.write('lat,' + lat1 + '\n')
-                f.write('lon,' + lon1 + '\n')
-                f.write('loc,' + place_name1 + '\n')
-                f.write('temp_unit,' + temp_button[0].get_label() + '\n')
-                f.write('speed_unit,' +speed_button[0].get_label() + '\n')
-                f.write('timeout,' + timeout + '\n')
-                f.write('font_size,' + str(font_size) + '\n')
-                f.write('x,' + str(pos[0]) + '\n')
-                f.write('y,' + str(pos[1]))
-            os.execv(sys.argv[0], sys.argv)  # reload
+            settings.write(dict(self.prefs_values, appid=appid_value, lat=lat1, lon=lon1, loc=place_name1,
+                                temp_unit=temp_button[0].get_label(), speed_unit=speed_button[0].get_label(),
+                                timeout=timeout, font_size=font_size, x=self.prefs_pos[0], y=self.prefs_pos[1]),
+                           self.path + os.sep + 'prefs')
+            self.apply_prefs(settings.read(self.path + os.sep + 'prefs'))
+            stop_search(prefs_win)
+            prefs_win.hide()
+
+        def close(widget, event):
+            stop_search(widget)
+            return widget.hide_on_delete()
+
+        def fill():
+            geosearch_input.set_text(self.prefs_values['loc'])
+            stop_search(geosearch_input)  # setting the text isn't the user typing
+            store.clear()
+            appid.set_text(self.prefs_values['appid'])
+            if self.prefs_values['temp_unit'] == 'F':
+                button2.set_active(True)
+            else:
+                button1.set_active(True)
+            if self.prefs_values['speed_unit'] == 'mph':
+                wnd_spd_button2.set_active(True)
+            elif self.prefs_values['speed_unit'] == 'm/s':
+                wnd_spd_button3.set_active(True)
+            elif self.prefs_values['speed_unit'] == 'kph':
+                wnd_spd_button4.set_active(True)
+            elif self.prefs_values['speed_unit'] == 'Bf':
+                wnd_spd_button5.set_active(True)
+            else:
+                wnd_spd_button1.set_active(True)
+            time_out.set_text(str(self.get_timeout()))
+            font.set_value(int(self.prefs_values['font_size']))
 
         #    def lock_position(self):
         #        self.pos = win.get_position()
@@ -941,8 +1214,8 @@ class Win(Gtk.Window):
         search_hbox = Gtk.HBox()
         box.pack_start(search_hbox, False, False, 0)
         geosearch_input = Gtk.SearchEntry()
-        geosearch_input.set_text(self.prefs_values['loc'])
         geosearch_input.connect("activate", geo_search)
+        geosearch_input.connect("changed", search_changed)
         search_hbox.pack_start(geosearch_input, True, True, 5)
         #        searchLabel.set_halign(Gtk.Align.START)
 
@@ -967,7 +1240,6 @@ class Win(Gtk.Window):
         appid_label.set_markup('<b>OpenWeatherMap key:</b>')
         appid = Gtk.Entry()
         box.pack_start(appid, False, False, 0)
-        appid.set_text(self.prefs_values['appid'])
         appid_label.set_halign(Gtk.Align.START)
 
         temp_box = Gtk.Box(spacing=6)
@@ -980,10 +1252,6 @@ class Win(Gtk.Window):
         button2 = Gtk.RadioButton.new_from_widget(button1)
         button2.set_label("F")
         temp_box.pack_start(button2, False, False, 0)
-        if self.prefs_values['temp_unit'] == 'F':
-            button2.set_active(True)
-        else:
-            button1.set_active(True)
 
         wnd_spd_box = Gtk.Box(spacing=6)
         box.pack_start(wnd_spd_box, False, False, 5)
@@ -1004,23 +1272,12 @@ class Win(Gtk.Window):
         wnd_spd_button5 = Gtk.RadioButton.new_from_widget(wnd_spd_button1)
         wnd_spd_button5.set_label("Bf")
         wnd_spd_box.pack_start(wnd_spd_button5, False, False, 0)
-        if self.prefs_values['speed_unit'] == 'mph':
-            wnd_spd_button2.set_active(True)
-        elif self.prefs_values['speed_unit'] == 'm/s':
-            wnd_spd_button3.set_active(True)
-        elif self.prefs_values['speed_unit'] == 'kph':
-            wnd_spd_button4.set_active(True)
-        elif self.prefs_values['speed_unit'] == 'Bf':
-            wnd_spd_button5.set_active(True)
-        else:
-            wnd_spd_button1.set_active(True)
 
         timeout_label = Gtk.Label()
         box.pack_start(timeout_label, False, False, 0)
         timeout_label.set_markup('<b>Refresh time (minutes):</b>')
         time_out = Gtk.Entry()
         box.pack_start(time_out, False, False, 5)
-        time_out.set_text(str(self.get_timeout()))
         timeout_label.set_halign(Gtk.Align.START)
 
         font_label = Gtk.Label()
@@ -1030,7 +1287,6 @@ class Win(Gtk.Window):
         font = Gtk.SpinButton()
         font.set_adjustment(font_adjustment)
         box.pack_start(font, False, False, 0)
-        font.set_value(int(self.prefs_values['font_size']))
         font_label.set_halign(Gtk.Align.START)
 
         #    lockButton = Gtk.Button.new_with_label("Lock position")
@@ -1046,15 +1302,16 @@ class Win(Gtk.Window):
         #        context = button.get_style_context()
         #        context.add_class('prefs')
 
-        prefs_win.connect('destroy', Gtk.main_quit)
-        prefs_win.show_all()
-        Gtk.main()
+        prefs_win.connect('delete-event', close)
+        self.trace_frames(prefs_win)
+        container.show_all()
+        return prefs_win, fill
 
 
 if __name__ == '__main__':
     win = Win()
     win.connect("destroy", Gtk.main_quit)
+    win.show_snapshot()
     win.show_all()
     win.the_loop()
-    timeout_add = GLib.timeout_add_seconds(win.get_timeout() * 60, win.the_loop)
     Gtk.main()
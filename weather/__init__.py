@@ -0,0 +1,2 @@
+# WeatherWidget (c) Don Atherton don@donatherton.co.uk
+""" GTK-free parts of the weather widget """
@@ -0,0 +1,120 @@
+# WeatherWidget (c) Don Atherton don@donatherton.co.uk
+""" Current conditions and the 5 day summary on the command line, no GTK needed.
+
+    python3 -m weather [--json] [--prefs FILE] [--lat LAT --lon LON] ...
+
+Settings not given on the command line come from the widget's prefs file.
+"""
+
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from weather import settings, units
+from weather.cache import ResponseCache
+from weather.fetch import fetch
+from weather.transport import Transport
+
+
+def as_dict(cc, forecast, prefs_values):
+    """ Both responses in the chosen units, ready for json.dumps """
+    temp_unit = prefs_values['temp_unit']
+    speed_unit = prefs_values['speed_unit']
+    out = {'location': prefs_values['loc'], 'temp_unit': temp_unit, 'speed_unit': speed_unit}
+    if cc is not None:
+        out['current'] = {
+            'temp': round(units.temperature(cc.temp, temp_unit), 1),
+            'feels_like': round(units.temperature(cc.feels_like, temp_unit), 1),
+            'description': cc.description,
+            'icon': cc.icon,
+            'wind_speed': round(units.wind_speed(cc.wind_speed, speed_unit)),
+            'wind_gust': None if cc.wind_gust is None else round(units.wind_speed(cc.wind_gust, speed_unit)),
+            'wind_dir': units.bearing(cc.wind_deg),
+            'pressure': cc.pressure,
+            'humidity': cc.humidity,
+            'sunrise': cc.sunrise_time,
+            'sunset': cc.sunset_time,
+            'server_time': cc.server_time,
+        }
+    if forecast is not None:
+        days = forecast.daily
+        out['daily'] = []
+        for i, (day, point) in enumerate(forecast.days):
+            out['daily'].append({
+                'day': day,
+                'max_temp': round(units.temperature(days.max_temp[i], temp_unit)),
+                'min_temp': round(units.temperature(days.min_temp[i], temp_unit)),
+                'description': point.description,
+                'icon': point.icon,
+                'wind_speed': round(units.wind_speed(days.mean_wind[i], speed_unit)),
+                'wind_gust': round(units.wind_speed(days.max_gust[i], speed_unit)),
+                'wind_dir': units.bearing(point.wind_deg),
+                'pop': round(days.max_pop[i] * 100),
+                'rain': round(days.rain[i], 1),
+                'pressure': round(days.mean_pres[i]),
+            })
+    return out
+
+
+def as_text(data):
+    deg = u'\N{DEGREE SIGN}' + data['temp_unit']
+    speed = ' ' + data['speed_unit']
+    lines = [data['location']]
+    cc = data.get('current')
+    if cc is not None:
+        gust = '' if cc['wind_gust'] is None else '/' + str(cc['wind_gust'])
+        lines.append(str(cc['temp']) + deg + ' f/l ' + str(cc['feels_like']) + deg + '  ' + cc['description'])
+        lines.append('Wind: ' + str(cc['wind_speed']) + gust + speed + ' ' + cc['wind_dir']
+                     + '  Pressure: ' + str(cc['pressure']) + ' mb  Humidity: ' + str(cc['humidity']) + '%')
+        lines.append('Sunrise: ' + cc['sunrise'] + '  Sunset: ' + cc['sunset'] + '  On server: ' + cc['server_time'])
+    for day in data.get('daily', []):
+        lines.append('  '.join([
+            day['day'],
+            (str(day['max_temp']) + '/' + str(day['min_temp']) + deg).rjust(8),
+            day['description'].ljust(20),
+            (str(day['wind_speed']) + '/' + str(day['wind_gust']) + speed).rjust(10),
+            day['wind_dir'].ljust(3),
+            (str(day['pop']) + '%').rjust(4),
+            (str(day['rain']) + ' mm').rjust(7),
+            str(day['pressure']) + ' mb']))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python3 -m weather', description=__doc__.split('\n')[0])
+    parser.add_argument('--prefs', default=settings.DEFAULT_PATH, help='prefs file to read settings from')
+    parser.add_argument('--appid', help='OpenWeatherMap API key')
+    parser.add_argument('--lat')
+    parser.add_argument('--lon')
+    parser.add_argument('--loc', help='place name to show')
+    parser.add_argument('--temp-unit', choices=units.TEMP_UNITS)
+    parser.add_argument('--speed-unit', choices=units.SPEED_UNITS)
+    parser.add_argument('--json', action='store_true', help='print JSON instead of text')
+    args = parser.parse_args(argv)
+
+    prefs_values = dict(settings.DEFAULTS)
+    try:
+        prefs_values.update(settings.read(args.prefs))
+    except (IndexError, FileNotFoundError):
+        pass
+    for name in ('appid', 'lat', 'lon', 'loc', 'temp_unit', 'speed_unit'):
+        if getattr(args, name) is not None:
+            prefs_values[name] = getattr(args, name)
+
+    transport = Transport()
+    cache = ResponseCache(os.path.join(os.path.dirname(os.path.abspath(args.prefs)), 'cache'), transport)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        cc, forecast = fetch(cache, pool, prefs_values['lat'], prefs_values['lon'], prefs_values['appid'])
+    transport.close()
+    if cc is None and forecast is None:
+        return 1
+
+    data = as_dict(cc, forecast, prefs_values)
+    print(json.dumps(data, indent=1, ensure_ascii=False) if args.json else as_text(data))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,178 @@
+# WeatherWidget (c) Don Atherton don@donatherton.co.uk
+""" Daily summaries of the 3 hourly forecast.
+
+Forecast values are held column by column in stdlib arrays. Points are grouped
+by location and local calendar day in a single pass, so one call can summarise
+any number of locations. For big batches NumPy is used if it is installed.
+"""
+
+from array import array
+
+DAY = 86400
+NUMPY_POINTS = 5000  # below this the pure Python pass is quicker than importing NumPy
+
+numpy = None
+
+
+class Columns:
+    """ 3 hourly forecast points, one array per value. dt is local time (UTC + offset) """
+
+    __slots__ = ('loc', 'dt', 'temp', 'wind_speed', 'wind_gust', 'rain', 'pop', 'pres')
+
+    def __init__(self):
+        self.loc = array('q')
+        self.dt = array('q')
+        self.temp = array('d')
+        self.wind_speed = array('d')
+        self.wind_gust = array('d')
+        self.rain = array('d')
+        self.pop = array('d')
+        self.pres = array('d')
+
+    def __len__(self):
+        return len(self.dt)
+
+    def add_forecast(self, forecast, loc=0):
+        """ Append the points of a decoded OpenWeatherMap /forecast response """
+        tz = forecast['city']['timezone']
+        for item in forecast['list']:
+            wind = item['wind']
+            self.loc.append(loc)
+            self.dt.append(item['dt'] + tz)
+            self.temp.append(item['main']['temp'])
+            self.wind_speed.append(wind['speed'])
+            self.wind_gust.append(wind.get('gust', 0))
+            self.rain.append(item.get('rain', {}).get('3h', 0))
+            self.pop.append(item.get('pop', 0))
+            self.pres.append(item['main']['pressure'])
+        return self
+
+    @classmethod
+    def from_forecasts(cls, forecasts):
+        """ One set of columns for many locations, loc is the index into forecasts """
+        columns = cls()
+        for loc, forecast in enumerate(forecasts):
+            columns.add_forecast(forecast, loc)
+        return columns
+
+
+class Daily:
+    """ One entry per (location, local day), in the order the points came in.
+        start and count give the slice of the input points each day covers """
+
+    __slots__ = ('loc', 'day', 'start', 'count', 'max_temp', 'min_temp', 'mean_wind',
+                 'max_gust', 'rain', 'max_pop', 'mean_pres')
+
+    def __init__(self):
+        for name in ('loc', 'day', 'start', 'count'):
+            setattr(self, name, array('q'))
+        for name in ('max_temp', 'min_temp', 'mean_wind', 'max_gust', 'rain', 'max_pop', 'mean_pres'):
+            setattr(self, name, array('d'))
+
+    def __len__(self):
+        return len(self.day)
+
+    def for_location(self, loc):
+        """ Indices of the days belonging to loc """
+        return [i for i, l in enumerate(self.loc) if l == loc]
+
+
+def have_numpy():
+    """ Import NumPy the first time it is wanted, it is slow to import """
+    global numpy
+    if numpy is None:
+        try:
+            import numpy
+        except ImportError:
+            numpy = False
+    return numpy is not False
+
+
+def daily(columns, use_numpy=None):
+    """ Summarise columns by location and local calendar day. By default NumPy is
+        only used, if installed, for batches of more than NUMPY_POINTS points """
+    if use_numpy is None:
+        use_numpy = len(columns) > NUMPY_POINTS and have_numpy()
+    elif use_numpy:
+        use_numpy = have_numpy()
+    if len(columns) == 0:
+        return Daily()
+    if use_numpy:
+        return _daily_numpy(columns)
+    return _daily_python(columns)
+
+
+def _daily_python(c):
+    out = Daily()
+    loc, dt, temp, wind, gust, rain, pop, pres = c.loc, c.dt, c.temp, c.wind_speed, c.wind_gust, c.rain, c.pop, c.pres
+
+    def flush():
+        out.loc.append(key[0])
+        out.day.append(key[1])
+        out.start.append(start)
+        out.count.append(n)
+        out.max_temp.append(max_t)
+        out.min_temp.append(min_t)
+        out.mean_wind.append(sum_w / n)
+        out.max_gust.append(max_g)
+        out.rain.append(sum_r)
+        out.max_pop.append(max_p)
+        out.mean_pres.append(sum_p / n)
+
+    key = None
+    for i in range(len(dt)):
+        t = temp[i]
+        k = (loc[i], dt[i] // DAY)
+        if k != key:
+            if key is not None:
+                flush()
+            key, start, n = k, i, 0
+            max_t = min_t = t
+            sum_w = sum_r = sum_p = 0.0
+            max_g = gust[i]
+            max_p = pop[i]
+        elif t > max_t:
+            max_t = t
+        elif t < min_t:
+            min_t = t
+        n += 1
+        sum_w += wind[i]
+        sum_r += rain[i]
+        sum_p += pres[i]
+        if gust[i] > max_g:
+            max_g = gust[i]
+        if pop[i] > max_p:
+            max_p = pop[i]
+    flush()
+    return out
+
+
+def _daily_numpy(c):
+    def col(values, dtype):
+        return numpy.frombuffer(values, dtype=dtype)
+
+    def to_array(typecode, values):
+        a = array(typecode)
+        a.frombytes(values.astype('int64' if typecode == 'q' else 'float64').tobytes())
+        return a
+
+    loc = col(c.loc, 'int64')
+    day = col(c.dt, 'int64') // DAY
+    edges = numpy.flatnonzero((day[1:] != day[:-1]) | (loc[1:] != loc[:-1])) + 1
+    starts = numpy.concatenate(([0], edges))
+    counts = numpy.diff(numpy.append(starts, len(day)))
+
+    out = Daily()
+    out.loc = to_array('q', loc[starts])
+    out.day = to_array('q', day[starts])
+    out.start = to_array('q', starts)
+    out.count = to_array('q', counts)
+    temp = col(c.temp, 'float64')
+    out.max_temp = to_array('d', numpy.maximum.reduceat(temp, starts))
+    out.min_temp = to_array('d', numpy.minimum.reduceat(temp, starts))
+    out.mean_wind = to_array('d', numpy.add.reduceat(col(c.wind_speed, 'float64'), starts) / counts)
+    out.max_gust = to_array('d', numpy.maximum.reduceat(col(c.wind_gust, 'float64'), starts))
+    out.rain = to_array('d', numpy.add.reduceat(col(c.rain, 'float64'), starts))
+    out.max_pop = to_array('d', numpy.maximum.reduceat(col(c.pop, 'float64'), starts))
+    out.mean_pres = to_array('d', numpy.add.reduceat(col(c.pres, 'float64'), starts) / counts)
+    return out
@@ -0,0 +1,115 @@
+# WeatherWidget (c) Don Atherton don@donatherton.co.uk
+""" On-disk cache of API responses """
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+from weather import trace
+
+
+class ResponseCache:
+    """ On-disk cache of API responses, kept in the cache directory next to prefs.
+        Entries are keyed by endpoint, lat, lon and units. Within its endpoint's TTL
+        an entry is used without touching the network, after that it is revalidated
+        with If-None-Match / If-Modified-Since if the server sent validators """
+
+    ttl = {'weather': 10 * 60, 'forecast': 60 * 60}  # seconds
+
+    def __init__(self, directory, transport, max_bytes=2 * 1024 * 1024):
+        self.directory = directory
+        self.transport = transport
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.requests = {}  # endpoint: requests sent to the server, for the schedules
+
+    def entry_path(self, endpoint, lat, lon, units):
+        key = hashlib.sha1((lat + ',' + lon + ',' + units).encode()).hexdigest()[:16]
+        return os.path.join(self.directory, endpoint + '-' + key + '.json')
+
+    @staticmethod
+    def read(path):
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def write(self, path, entry):
+        with self.lock:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp = path + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(entry, f)
+            os.replace(tmp, path)
+            self.evict(keep=path)
+
+    def evict(self, keep):
+        """ Remove least recently written entries until the cache fits in max_bytes """
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:  # removed by another widget sharing the directory
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        total = sum(e[1] for e in entries)
+        for mtime, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path != keep:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+    def peek(self, endpoint, lat, lon, units):
+        """ (decoded response, time fetched) however old the entry is, or (None, None) """
+        entry = self.read(self.entry_path(endpoint, lat, lon, units))
+        if entry is None:
+            return None, None
+        return json.loads(entry['body']), entry['fetched']
+
+    def get_json(self, endpoint, url, lat, lon, units, cancel=None, max_age=None):
+        """ Decoded response for endpoint, from the cache if fresh enough. max_age
+            overrides the endpoint's TTL, 0 always asks the server """
+        path = self.entry_path(endpoint, lat, lon, units)
+        with trace.span('cache read', endpoint=endpoint):
+            entry = self.read(path)
+        now = time.time()
+        if max_age is None:
+            max_age = self.ttl.get(endpoint, 10 * 60)
+        if entry is not None and now - entry['fetched'] < max_age:
+            with trace.span('json decode', endpoint=endpoint):
+                return json.loads(entry['body'])
+
+        headers = {}
+        if entry is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        with self.lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+        response = self.transport.get(url, headers, cancel)
+        if response is None:
+            return None
+        if response.status == 304 and entry is not None:
+            entry['fetched'] = now
+        else:
+            entry = {'fetched': now,
+                     'etag': response.headers.get('ETag'),
+                     'last_modified': response.headers.get('Last-Modified'),
+                     'body': response.body.decode('utf-8')}
+        with trace.span('json decode', endpoint=endpoint):
+            data = json.loads(entry['body'])
+        with trace.span('cache write', endpoint=endpoint):
+            try:
+                self.write(path, entry)
+            except OSError as e:  # a full or read-only disk only costs the next request
+                print(e)
+        return data
@@ -0,0 +1,156 @@
+# WeatherWidget (c) Don Atherton don@donatherton.co.uk
+""" The 3 hourly forecast as a chart: temperature line, rain bars, chance of rain
+shading and gust markers.
+
+layout() works out everything to draw for a size once, as plain numbers, and
+paint() draws it on a Cairo context in a single pass, grouping shapes of one
+colour into one path. The widget keeps the Geometry until the data, units, theme
+or size change, so a redraw is only paint(). Neither needs GTK.
+"""
+
+from weather import units
+
+DEGREE = u'\N{DEGREE SIGN}'
+TOP = 16  # room for the day names
+MARGIN = 2
+MIN_RAIN_SCALE = 5.0  # mm in 3 hours at full rain bar height, so a drizzle stays small
+MIN_GUST_SCALE = 20.0  # m/s at the top of the chart
+
+
+def rgb(colour):
+    """ '#rrggbb' to Cairo's 0-1 floats """
+    return int(colour[1:3], 16) / 255, int(colour[3:5], 16) / 255, int(colour[5:7], 16) / 255
+
+
+def runs(items):
+    """ [(colour, [item, ...]), ...] joining neighbours of the same colour """
+    grouped = []
+    for colour, item in items:
+        if grouped and grouped[-1][0] == colour:
+            grouped[-1][1].append(item)
+        else:
+            grouped.append((colour, [item]))
+    return grouped
+
+
+class Geometry:
+    """ What paint() draws, in device units for a chart of width x height """
+
+    __slots__ = ('width', 'height', 'top', 'bottom', 'pop', 'pop_rgb', 'rain', 'rain_rgb', 'days',
+                 'line', 'gusts', 'labels')
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.top = TOP
+        self.bottom = height - MARGIN
+        self.pop = []  # (x, width, alpha)
+        self.pop_rgb = self.rain_rgb = (0, 0, 0)
+        self.rain = []  # (x, y, width, height)
+        self.days = []  # x of each day boundary
+        self.line = []  # (rgb, [(x, y), ...]) one run of the temperature line per colour
+        self.gusts = []  # (rgb, [(x, y), ...])
+        self.labels = []  # (x, y, text)
+
+
+def layout(points, width, height, temp_unit, palette):
+    """ Geometry of model.Point points on a width x height chart """
+    geometry = Geometry(width, height)
+    if not points or width <= 2 * MARGIN or height <= TOP + MARGIN:
+        return geometry
+    top, bottom = geometry.top, geometry.bottom
+    plot_height = bottom - top
+    slot = (width - 2 * MARGIN) / len(points)
+    left = [MARGIN + i * slot for i in range(len(points))]
+    centre = [x + slot / 2 for x in left]
+
+    # Chance of rain, shading the whole height of its slot
+    geometry.pop_rgb = rgb(palette.chart_pop)
+    geometry.pop = [(left[i], slot, point.pop * 0.35) for i, point in enumerate(points) if point.pop > 0]
+
+    # Rain, bars up from the bottom over at most 40% of the height
+    geometry.rain_rgb = rgb(palette.chart_rain)
+    scale = 0.4 * plot_height / max(MIN_RAIN_SCALE, max(point.rain for point in points))
+    bar = slot * 0.6
+    for i, point in enumerate(points):
+        if point.rain > 0:
+            h = max(1.0, point.rain * scale)
+            geometry.rain.append((centre[i] - bar / 2, bottom - h, bar, h))
+
+    # Day boundaries at local midnight, with the day name after each
+    starts = [0] + [i for i, point in enumerate(points) if i and point.hour == '00']
+    geometry.days = [left[i] for i in starts[1:]]
+    ends = starts[1:] + [len(points)]
+    geometry.labels = [(left[i] + 2, 0, points[i].day) for i, end in zip(starts, ends) if (end - i) * slot >= 28]
+
+    # Temperature, in the middle 80% of the height, coloured by band
+    temps = units.temperature_column([point.temp for point in points], temp_unit)
+    colours = palette.temp.column([point.temp for point in points])
+    low, high = min(temps), max(temps)
+    span = max(high - low, 1.0)
+    ys = [top + plot_height * (0.1 + 0.8 * (high - t) / span) for t in temps]
+    segments = []
+    for i in range(len(points) - 1):
+        segments.append((colours[i], ((centre[i], ys[i]), (centre[i + 1], ys[i + 1]))))
+    for colour, run in runs(segments):
+        geometry.line.append((rgb(colour), [run[0][0]] + [segment[1] for segment in run]))
+    hottest = temps.index(high)
+    coldest = temps.index(low)
+    geometry.labels.append((min(centre[hottest], width - 30), ys[hottest] - 14, str(round(high)) + DEGREE))
+    if coldest != hottest:
+        geometry.labels.append((min(centre[coldest], width - 30), ys[coldest] + 2, str(round(low)) + DEGREE))
+
+    # Gusts, on their own scale from the bottom, coloured like the table's wind
+    gusts = [(i, point.wind_gust) for i, point in enumerate(points) if point.wind_gust is not None]
+    if gusts:
+        scale = plot_height / max(MIN_GUST_SCALE, max(gust for i, gust in gusts))
+        geometry.gusts = [(rgb(colour), run) for colour, run in runs(
+            (palette.wind(gust), (centre[i], bottom - gust * scale)) for i, gust in gusts)]
+    return geometry
+
+
+def paint(cr, geometry, text, text_rgb):
+    """ Draw geometry on Cairo context cr. text(x, y, string) draws a label in the
+        widget's font, text_rgb is the colour for labels and day lines """
+    top, bottom = geometry.top, geometry.bottom
+    if geometry.pop:
+        r, g, b = geometry.pop_rgb
+        for x, w, alpha in geometry.pop:
+            cr.set_source_rgba(r, g, b, alpha)
+            cr.rectangle(x, top, w, bottom - top)
+            cr.fill()
+
+    if geometry.rain:
+        cr.set_source_rgb(*geometry.rain_rgb)
+        for x, y, w, h in geometry.rain:
+            cr.rectangle(x, y, w, h)
+        cr.fill()
+
+    cr.set_source_rgba(text_rgb[0], text_rgb[1], text_rgb[2], 0.4)
+    cr.set_line_width(1)
+    for x in geometry.days:
+        cr.move_to(round(x) + 0.5, 0)
+        cr.line_to(round(x) + 0.5, bottom)
+    cr.stroke()
+
+    cr.set_line_width(2)
+    cr.set_line_join(1)  # cairo.LINE_JOIN_ROUND
+    for colour, run in geometry.line:
+        cr.set_source_rgb(*colour)
+        cr.move_to(*run[0])
+        for x, y in run[1:]:
+            cr.line_to(x, y)
+        cr.stroke()
+
+    for colour, run in geometry.gusts:
+        cr.set_source_rgb(*colour)
+        for x, y in run:  # small triangles pointing down at the gust
+            cr.move_to(x, y + 2)
+            cr.line_to(x - 3, y - 3)
+            cr.line_to(x + 3, y - 3)
+            cr.close_path()
+        cr.fill()
+
+    cr.set_source_rgb(*text_rgb)
+    for x, y, label in geometry.labels:
+        text(x, y, label)
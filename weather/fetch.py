@@ -0,0 +1,66 @@
+# WeatherWidget (c) Don Atherton don@donatherton.co.uk
+""" Downloads current conditions and the forecast for one place """
+
+import os
+from urllib.parse import urlencode
+
+from weather import model, trace
+
+API = os.environ.get('WEATHER_WIDGET_API', 'https://api.openweathermap.org/data/2.5/')
+ENDPOINTS = ('weather', 'forecast')
+
+
+def cached(cache, lat, lon):
+    """ Whatever the cache last stored for this place, however old, to show straight
+        away at startup. Returns (model.Current, model.Forecast, time fetched) """
+    results = []
+    fetched = None
+    for endpoint, parse in (('weather', model.Current), ('forecast', model.Forecast)):
+        data, when = cache.peek(endpoint, lat, lon, 'metric')
+        try:
+            results.append(None if data is None else parse(data))
+        except (KeyError, IndexError, TypeError):
+            results.append(None)
+        if when is not None:
+            fetched = when if fetched is None else min(fetched, when)
+    return results[0], results[1], fetched
+
+
+def submit(cache, pool, lat, lon, appid, cancel=None, endpoints=ENDPOINTS, max_age=None):
+    """ Queue requests for endpoints on pool, returns the futures for collect.
+        max_age is passed on to the cache """
+    query = '?' + urlencode({'lat': lat, 'lon': lon, 'units': 'metric', 'appid': appid})
+    return [pool.submit(cache.get_json, endpoint, API + endpoint + query, lat, lon, 'metric', cancel, max_age)
+            if endpoint in endpoints else None for endpoint in ENDPOINTS]
+
+
+def collect(jobs):
+    """ Wait for the futures from submit. Returns (model.Current, model.Forecast), either
+        is None if it wasn't asked for or its request failed or was cancelled, so the
+        caller can show what it did get """
+    results = []
+    for job, parse in zip(jobs, (model.Current, model.Forecast)):
+        if job is None:
+            results.append(None)
+            continue
+        try:
+            data = job.result()
+            with trace.span('parse', model=parse.__name__):
+                results.append(None if data is None else parse(data))
+        except Exception as e:
+            print(e)
+            results.append(None)
+    return results[0], results[1]
+
+
+def fetch(cache, pool, lat, lon, appid, cancel=None):
+    """ Request both endpoints at once through cache, using pool's threads """
+    return collect(submit(cache, pool, lat, lon, appid, cancel))
+
+
+def fetch_many(cache, pool, places, appid, cancel=None, endpoints=ENDPOINTS, max_age=None):
+    """ fetch for every (lat, lon) in places. All requests are queued on pool at once,
+        its size bounds how many run together. A failure only affects its own place.
+        Returns a list of (model.Current, model.Forecast) in the order of places """
+    jobs = [submit(cache, pool, lat, lon, appid, cancel, endpoints, max_age) for lat, lon in places]
+    return [collect(place_jobs) for place_jobs in jobs]
@@ -0,0 +1,170 @@
+# WeatherWidget (c) Don Atherton don@donatherton.co.uk
+""" Offline place search from a GeoNames dump.
+
+The dump (e.g. cities15000.txt from https://download.geonames.org/export/dump/)
+is turned once into an index file: records sorted by lower case name, one for
+the name and one for the ASCII name of each place, preceded by a table of record
+offsets and a table of record numbers from the most populous place down. The
+index is memory mapped and searched by bisecting on the offsets, so only the
+pages a lookup touches are read. A short prefix that matches many records is
+ranked by walking the population table for records within its range, so the
+most populous matches are found without reading every one.
+"""
+
+import itertools
+import mmap
+import os
+import struct
+import threading
+from array import array
+from bisect import bisect_left
+
+MAGIC = b'WWGZ2\n'
+HEADER = struct.Struct('=6sI')  # magic, record count. The index is native byte order
+SCAN = 250  # a prefix matching more records than this is ranked from the population table
+
+
+def normalise(text):
+    return ' '.join(text.casefold().split())
+
+
+def build(dump, index):
+    """ Write the index for a GeoNames tab separated dump. Records are
+        key, geonameid, population, name, country, lat, lon """
+    records = []
+    with open(dump, encoding='utf-8') as f:
+        for line in f:
+            fields = line.rstrip('\n').split('\t')
+            if len(fields) < 15 or fields[0].startswith('#'):
+                continue
+            geonameid, name, asciiname, lat, lon, country = (fields[0], fields[1], fields[2],
+                                                             fields[4], fields[5], fields[8])
+            population = fields[14] or '0'
+            for key in {normalise(name), normalise(asciiname)}:
+                if key:
+                    records.append(('\t'.join((key, geonameid, population, name, country, lat, lon)).encode(),
+                                    int(population)))
+    records.sort()
+    ranked = array('I', sorted(range(len(records)), key=lambda i: -records[i][1]))
+    records = [record for record, population in records]
+
+    offsets = array('I')
+    position = 0
+    for record in records:
+        offsets.append(position)
+        position += len(record) + 1
+
+    tmp = index + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(records)))
+        f.write(offsets.tobytes())
+        f.write(ranked.tobytes())
+        for record in records:
+            f.write(record + b'\n')
+    os.replace(tmp, index)
+
+
+class Keys:
+    """ The record keys of an open index as a sequence, for bisect. ranked is the
+        record numbers, most populous place first """
+
+    def __init__(self, data, offsets, ranked, base):
+        self.data = data
+        self.offsets = offsets
+        self.ranked = ranked
+        self.base = base
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, i):
+        start = self.base + self.offsets[i]
+        return self.data[start:self.data.find(b'\t', start)]
+
+    def record(self, i):
+        start = self.base + self.offsets[i]
+        return self.data[start:self.data.find(b'\n', start)].decode().split('\t')
+
+
+class Gazetteer:
+    """ Place search over the index of dump, built or rebuilt on first use when the
+        dump is newer than index. Searches nothing if there is no dump """
+
+    def __init__(self, dump, index):
+        self.dump = dump
+        self.index = index
+        self.keys = None
+        self.mtime = None
+        self.lock = threading.Lock()
+
+    def open(self):
+        """ Keys of the current index, or None if there is no gazetteer """
+        with self.lock:
+            try:
+                dump_mtime = os.stat(self.dump).st_mtime
+            except OSError:
+                dump_mtime = None
+            try:
+                index_mtime = os.stat(self.index).st_mtime
+            except OSError:
+                index_mtime = None
+            if dump_mtime is not None and (index_mtime is None or dump_mtime > index_mtime
+                                           or self.magic() != MAGIC):  # or made by an older version
+                build(self.dump, self.index)
+                index_mtime = os.stat(self.index).st_mtime
+            if index_mtime is None:
+                self.keys = None
+            elif index_mtime != self.mtime:
+                with open(self.index, 'rb') as f:
+                    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                magic, count = HEADER.unpack_from(data)
+                if magic != MAGIC:
+                    raise ValueError(self.index + ' is not a gazetteer index')
+                tables = memoryview(data)[HEADER.size:HEADER.size + 8 * count].cast('I')
+                self.keys = Keys(data, tables[:count], tables[count:], HEADER.size + 8 * count)
+            self.mtime = index_mtime
+            return self.keys
+
+    def magic(self):
+        try:
+            with open(self.index, 'rb') as f:
+                return f.read(len(MAGIC))
+        except OSError:
+            return None
+
+    def search(self, query, limit=5):
+        """ Places whose name starts with the part of query before any comma, as
+            (display name, name, lat, lon). Exact names come first, then the most
+            populous. Words after a comma must appear in the name or country code """
+        keys = self.open()
+        name, _, rest = query.partition(',')
+        prefix = normalise(name).encode()
+        if keys is None or not prefix:
+            return []
+        words = normalise(rest.replace(',', ' ')).split()
+
+        first = bisect_left(keys, prefix)
+        end = bisect_left(keys, prefix + b'\xff', first)  # no key has 0xff, it isn't in UTF-8
+        if end - first <= SCAN:
+            candidates = range(first, end)
+            exact = end
+        else:
+            # The exact names, which sort first, then the rest in population order, so
+            # the first limit of those are the most populous
+            exact = first
+            while exact < end and keys[exact] == prefix:
+                exact += 1
+            candidates = itertools.chain(range(first, exact), (i for i in keys.ranked if first <= i < end))
+
+        matches = {}
+        for i in candidates:
+            if len(matches) >= limit and not first <= i < exact:
+                break
+            key, geonameid, population, place, country, lat, lon = keys.record(i)
+            if geonameid in matches:
+                continue
+            if words and not all(w in place.casefold() or w == country.casefold() for w in words):
+                continue
+            matches[geonameid] = (key.encode() != prefix, -int(population), place, country, lat, lon)
+        ranked = sorted(matches.values())[:limit]
+        return [(place + ', ' + country, place, lat, lon) for _, _, place, country, lat, lon in ranked]
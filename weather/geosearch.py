@@ -0,0 +1,63 @@
+# WeatherWidget (c) Don Atherton don@donatherton.co.uk
+""" Place search, in the offline gazetteer if there is one and then through
+    Nominatim, with the answers kept per query """
+
+import os
+import threading
+from collections import OrderedDict
+from urllib.parse import urlencode
+
+from weather import trace
+
+SEARCH_URL = os.environ.get('WEATHER_WIDGET_SEARCH', 'https://nominatim.openstreetmap.org/search')
+
+
+def place_name(address):
+    """ Short name for a Nominatim address: its city, town or village """
+    for key in ('city', 'town', 'village'):
+        if key in address:
+            return address[key]
+    return 'Unknown'
+
+
+class GeoSearch:
+    """ Up to 5 matches per query as (display name, name, lat, lon). Nominatim is only
+        asked if gazetteer finds nothing. Answers are kept for the max_entries most
+        recently used queries """
+
+    def __init__(self, transport, gazetteer=None, max_entries=64):
+        self.transport = transport
+        self.gazetteer = gazetteer
+        self.max_entries = max_entries
+        self.results = OrderedDict()
+        self.lock = threading.Lock()
+
+    def search(self, query, cancel=None):
+        """ Matches for query, or None if cancel was set before the answer came in """
+        key = ' '.join(query.lower().split())
+        with self.lock:
+            if key in self.results:
+                self.results.move_to_end(key)
+                return self.results[key]
+
+        if self.gazetteer is not None:
+            try:
+                with trace.span('gazetteer'):
+                    results = self.gazetteer.search(query)
+            except (OSError, ValueError) as e:
+                print(e)
+                results = None
+            if results:
+                return results
+
+        url = SEARCH_URL + '?' + urlencode({'format': 'json', 'addressdetails': 1, 'q': query, 'limit': 5})
+        location = self.transport.get_json(url, cancel)
+        if location is None:
+            return None
+        results = [(item['display_name'], place_name(item.get('address', {})), item['lat'], item['lon'])
+                   for item in location]
+        with self.lock:
+            self.results[key] = results
+            while len(self.results) > self.max_entries:
+                self.results.popitem(last=False)
+        return results
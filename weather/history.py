@@ -0,0 +1,202 @@
+# WeatherWidget (c) Don Atherton don@donatherton.co.uk
+""" Every current conditions and forecast the widget fetches, kept in SQLite.
+
+Observations are keyed by place and the server's timestamp, so a refresh that
+brings back the same observation adds nothing. Forecasts are keyed by place, the
+run (the time of its first 3 hourly point) and the point's time, so they can be
+checked against what was observed later. Both tables are WITHOUT ROWID with that
+key as the primary key: a range query for one place is a single index scan.
+
+Observations older than FULL are thinned to one per hour, the mean of that hour,
+and anything older than the retention limits is deleted. The database is in WAL
+mode so the worker thread writing a refresh doesn't hold up reads on the main loop.
+"""
+
+import sqlite3
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from contextlib import contextmanager
+from itertools import groupby
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+FULL = 7 * DAY  # observations at full resolution, then hourly
+RETENTION = 400 * DAY  # observations
+FORECAST_RETENTION = 30 * DAY  # forecast runs
+PRUNE_EVERY = HOUR
+
+OBSERVED = ('temp', 'feels_like', 'pressure', 'humidity', 'clouds', 'wind_speed', 'wind_gust', 'wind_deg')
+FORECAST = ('temp', 'feels_like', 'pressure', 'humidity', 'clouds', 'wind_speed', 'wind_gust', 'wind_deg', 'rain', 'pop')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS observations (
+    place TEXT NOT NULL, dt INTEGER NOT NULL,
+    temp REAL, feels_like REAL, pressure REAL, humidity REAL, clouds REAL,
+    wind_speed REAL, wind_gust REAL, wind_deg INTEGER,
+    PRIMARY KEY (place, dt)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS forecasts (
+    place TEXT NOT NULL, run INTEGER NOT NULL, dt INTEGER NOT NULL,
+    temp REAL, feels_like REAL, pressure REAL, humidity REAL, clouds REAL,
+    wind_speed REAL, wind_gust REAL, wind_deg INTEGER, rain REAL, pop REAL,
+    PRIMARY KEY (place, run, dt)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER) WITHOUT ROWID;
+'''
+
+
+def place_key(lat, lon):
+    return lat + ',' + lon
+
+
+def mean(values):
+    values = [value for value in values if value is not None]
+    return sum(values) / len(values) if values else None
+
+
+def thin(rows):
+    """ One observation row standing for rows, all of the same place and hour: the
+        means, the highest gust and, as a mean of bearings is no use, the last wind
+        direction """
+    columns = list(zip(*rows))
+    gusts = [gust for gust in columns[8] if gust is not None]
+    return (rows[0][0], rows[0][1] // HOUR * HOUR) + tuple(mean(column) for column in columns[2:8]) \
+        + (max(gusts) if gusts else None, rows[-1][9])
+
+
+class History:
+    """ The history database at path. One connection, shared by the threads under a
+        lock, the way ResponseCache shares its directory """
+
+    def __init__(self, path, full=FULL, retention=RETENTION, forecast_retention=FORECAST_RETENTION):
+        self.path = path
+        self.full = full
+        self.retention = retention
+        self.forecast_retention = forecast_retention
+        self.lock = threading.Lock()
+        self.db = None
+        self.pruned = 0
+
+    def connect(self):
+        if self.db is None:
+            db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')  # in WAL mode a crash can only lose the last commits
+            db.executescript(SCHEMA)
+            self.db = db
+        return self.db
+
+    def close(self):
+        with self.lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
+
+    @contextmanager
+    def transaction(self):
+        with self.lock:
+            db = self.connect()
+            db.execute('BEGIN')
+            try:
+                yield db
+            except BaseException:
+                db.execute('ROLLBACK')
+                raise
+            db.execute('COMMIT')
+
+    def add(self, lat, lon, cc=None, forecast=None, now=None):
+        """ Keep a model.Current and/or model.Forecast of the place at lat, lon """
+        place = place_key(lat, lon)
+        with self.transaction() as db:
+            if cc is not None:
+                db.execute('INSERT OR IGNORE INTO observations VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                           (place, cc.dt) + tuple(getattr(cc, name) for name in OBSERVED))
+            if forecast is not None and forecast.points:
+                run = forecast.points[0].dt
+                db.executemany('INSERT OR REPLACE INTO forecasts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                               [(place, run, point.dt) + tuple(getattr(point, name) for name in FORECAST)
+                                for point in forecast.points])
+        now = time.time() if now is None else now
+        if now - self.pruned >= PRUNE_EVERY:
+            self.prune(now)
+
+    def add_many(self, rows):
+        """ Observations as (place key, dt, temp, feels_like, pressure, humidity, clouds,
+            wind_speed, wind_gust, wind_deg) tuples in one transaction, for imports """
+        with self.transaction() as db:
+            db.executemany('INSERT OR IGNORE INTO observations VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+
+    def prune(self, now):
+        """ Thin observations older than full to hourly means, then drop what is past
+            retention. Only the hours not thinned before are looked at """
+        self.pruned = now
+        cutoff = int(now - self.full) // HOUR * HOUR
+        with self.transaction() as db:
+            row = db.execute("SELECT value FROM meta WHERE name = 'thinned'").fetchone()
+            start = row[0] if row else 0
+            if cutoff > start:
+                rows = db.execute('SELECT * FROM observations WHERE dt >= ? AND dt < ? ORDER BY place, dt',
+                                  (start, cutoff)).fetchall()
+                hours = [thin(list(group)) for _, group in groupby(rows, key=lambda row: (row[0], row[1] // HOUR))]
+                db.executemany('DELETE FROM observations WHERE place = ? AND dt >= ? AND dt < ?',
+                               [(hour[0], hour[1], hour[1] + HOUR) for hour in hours])
+                db.executemany('INSERT INTO observations VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', hours)
+                db.execute("INSERT OR REPLACE INTO meta VALUES ('thinned', ?)", (cutoff,))
+            db.execute('DELETE FROM observations WHERE dt < ?', (int(now - self.retention),))
+            db.execute('DELETE FROM forecasts WHERE run < ?', (int(now - self.forecast_retention),))
+
+    def series(self, lat, lon, column, start, end, points=None):
+        """ (times, values) arrays of an observed column between start and end. With
+            points, averaged down to at most that many buckets, for a sparkline """
+        if column not in OBSERVED:
+            raise ValueError('no such column: ' + column)
+        place = place_key(lat, lon)
+        start, end = int(start), int(end)
+        if points:
+            width = max(1, -(-(end - start) // points))
+            sql = ('SELECT min(dt), avg(%s) FROM observations WHERE place = ? AND dt >= ? AND dt < ? AND %s IS NOT NULL '
+                   'GROUP BY (dt - ?) / ? ORDER BY 1' % (column, column))
+            args = (place, start, end, start, width)
+        else:
+            sql = ('SELECT dt, %s FROM observations WHERE place = ? AND dt >= ? AND dt < ? AND %s IS NOT NULL '
+                   'ORDER BY dt' % (column, column))
+            args = (place, start, end)
+        with self.lock:
+            rows = self.connect().execute(sql, args).fetchall()
+        return array('q', [row[0] for row in rows]), array('d', [row[1] for row in rows])
+
+    def tendency(self, lat, lon, column='pressure', span=3 * HOUR):
+        """ Change in column over the span before the latest observation, or None """
+        if column not in OBSERVED:
+            raise ValueError('no such column: ' + column)
+        place = place_key(lat, lon)
+        with self.lock:
+            db = self.connect()
+            latest = db.execute('SELECT dt, %s FROM observations WHERE place = ? ORDER BY dt DESC LIMIT 1' % column,
+                                (place,)).fetchone()
+            if latest is None:
+                return None
+            earlier = db.execute('SELECT dt, %s FROM observations WHERE place = ? AND dt <= ? ORDER BY dt DESC LIMIT 1'
+                                 % column, (place, latest[0] - span)).fetchone()
+        if earlier is None or latest[0] - earlier[0] > 2 * span or latest[1] is None or earlier[1] is None:
+            return None
+        return latest[1] - earlier[1]
+
+    def forecast_errors(self, lat, lon, start, end, column='temp', tolerance=HOUR):
+        """ (lead time, forecast, observed) for each forecast point between start and end
+            that has an observation within tolerance of it, to see how reliable the
+            forecast has been at each lead time """
+        if column not in OBSERVED:
+            raise ValueError('no such column: ' + column)
+        times, observed = self.series(lat, lon, column, start - tolerance, end + tolerance)
+        with self.lock:
+            rows = self.connect().execute(
+                'SELECT run, dt, %s FROM forecasts WHERE place = ? AND dt >= ? AND dt < ? AND %s IS NOT NULL'
+                % (column, column), (place_key(lat, lon), start, end)).fetchall()
+        errors = []
+        for run, dt, value in rows:
+            i = bisect_left(times, dt)
+            nearest = min((j for j in (i - 1, i) if 0 <= j < len(times)), key=lambda j: abs(times[j] - dt), default=None)
+            if nearest is not None and abs(times[nearest] - dt) <= tolerance:
+                errors.append((dt - run, value, observed[nearest]))
+        return errors
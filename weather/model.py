@@ -0,0 +1,105 @@
+# WeatherWidget (c) Don Atherton don@donatherton.co.uk
+""" OpenWeatherMap responses parsed once into compact objects.
+
+Everything is in the units the API was asked for (metric). Times are converted
+once to the location's local time, using the UTC offset the API sends, and the
+strings the views show are worked out here so neither view touches the JSON.
+"""
+
+from datetime import datetime
+
+from weather import aggregate, trace
+
+
+def local_time(timestamp, timezone):
+    """ Location local time for a UTC timestamp and the API's UTC offset in seconds """
+    return datetime.utcfromtimestamp(timestamp + timezone)
+
+
+class Current:
+    """ /weather response """
+
+    __slots__ = ('dt', 'timezone', 'temp', 'feels_like', 'pressure', 'humidity', 'clouds',
+                 'description', 'icon', 'wind_speed', 'wind_gust', 'wind_deg',
+                 'sunrise', 'sunset', 'server_time', 'sunrise_time', 'sunset_time', 'views')
+
+    def __init__(self, cc):
+        main = cc['main']
+        wind = cc['wind']
+        self.dt = cc['dt']
+        self.timezone = cc['timezone']
+        self.temp = main['temp']
+        self.feels_like = main['feels_like']
+        self.pressure = main['pressure']
+        self.humidity = main['humidity']
+        self.clouds = cc.get('clouds', {}).get('all', 0)
+        self.description = cc['weather'][0]['description']
+        self.icon = cc['weather'][0]['icon']
+        self.wind_speed = wind['speed']
+        self.wind_gust = wind.get('gust')  # None if not reported
+        self.wind_deg = wind.get('deg', 0)
+        self.sunrise = cc['sys']['sunrise']
+        self.sunset = cc['sys']['sunset']
+
+        self.server_time = local_time(self.dt, self.timezone).strftime('%H:%M:%S')
+        self.sunrise_time = local_time(self.sunrise, self.timezone).strftime('%H:%M')
+        self.sunset_time = local_time(self.sunset, self.timezone).strftime('%H:%M')
+        self.views = {}  # weather.present's display strings, per unit combination
+
+
+class Point:
+    """ One 3 hourly entry of the /forecast response """
+
+    __slots__ = ('dt', 'day', 'hour', 'is_day', 'temp', 'feels_like', 'pressure', 'humidity',
+                 'clouds', 'description', 'icon', 'wind_speed', 'wind_gust', 'wind_deg', 'rain', 'pop')
+
+    def __init__(self, item, timezone, sunrise_minutes, sunset_minutes):
+        main = item['main']
+        wind = item['wind']
+        local = local_time(item['dt'], timezone)
+        self.dt = item['dt']
+        self.day = local.strftime('%a')
+        self.hour = local.strftime('%H')
+        self.is_day = sunrise_minutes <= local.hour * 60 + local.minute <= sunset_minutes
+        self.temp = main['temp']
+        self.feels_like = main['feels_like']
+        self.pressure = main['pressure']
+        self.humidity = main['humidity']
+        self.clouds = item['clouds']['all']
+        self.description = item['weather'][0]['description']
+        self.icon = item['weather'][0]['icon']
+        self.wind_speed = wind['speed']
+        self.wind_gust = wind.get('gust')  # None if not reported
+        self.wind_deg = wind.get('deg', 0)
+        self.rain = item.get('rain', {}).get('3h', 0)
+        self.pop = item.get('pop', 0)
+
+
+class Forecast:
+    """ /forecast response. points for the 3 hourly table, daily for the summary """
+
+    __slots__ = ('timezone', 'sunrise', 'sunset', 'sunrise_time', 'sunset_time', 'points', 'daily', 'days', 'views')
+
+    def __init__(self, forecast):
+        city = forecast['city']
+        self.timezone = city['timezone']
+        self.sunrise = city['sunrise']
+        self.sunset = city['sunset']
+        sunrise = local_time(self.sunrise, self.timezone)
+        sunset = local_time(self.sunset, self.timezone)
+        self.sunrise_time = sunrise.strftime('%H:%M')
+        self.sunset_time = sunset.strftime('%H:%M')
+
+        sunrise_minutes = sunrise.hour * 60 + sunrise.minute
+        sunset_minutes = sunset.hour * 60 + sunset.minute
+        self.points = [Point(item, self.timezone, sunrise_minutes, sunset_minutes) for item in forecast['list']]
+
+        with trace.span('aggregate', points=len(self.points)):
+            self.daily = aggregate.daily(aggregate.Columns().add_forecast(forecast))
+        # Day name and the point whose icon, description and wind direction stand for each day
+        self.days = []
+        for i in range(len(self.daily)):
+            count = self.daily.count[i]
+            index = self.daily.start[i] + (count - 1 if count < 5 else 4)  # pick 22h today or 13h
+            self.days.append((self.points[index].day, self.points[index]))
+        self.views = {}
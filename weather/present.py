@@ -0,0 +1,148 @@
+# WeatherWidget (c) Don Atherton don@donatherton.co.uk
+""" What the widget shows, worked out from the metric model for a temperature
+and wind speed unit and a theme.Palette.
+
+Each function returns display strings, with any text from the API escaped for
+Pango markup. The result is kept on the model object, one per combination of
+units and palette, so switching units and back re-renders from memory and a
+refresh, which brings new model objects, starts afresh. Unit converters are
+picked once per view, and the 5 day table converts and colours whole columns.
+"""
+
+from html import escape
+
+from weather import theme, units
+
+DEGREE = u'\N{DEGREE SIGN}'
+
+
+class CurrentView:
+    """ Current conditions. *_markup are Pango markup, the rest plain text """
+
+    __slots__ = ('temperature_markup', 'description_markup', 'icon', 'wind', 'pressure', 'humidity',
+                 'sun', 'server_time')
+
+    def __init__(self, cc, temp_unit, speed_unit):
+        to_temp = units.temperature_converter(temp_unit)
+        to_speed = units.speed_converter(speed_unit)
+        deg = DEGREE + temp_unit
+        temp = str(round(to_temp(cc.temp), 1))
+        feels_like = str(round(to_temp(cc.feels_like), 1))
+        wnd_spd = str(round(to_speed(cc.wind_speed)))
+        if cc.wind_gust is not None:
+            gust = '/' + str(round(to_speed(cc.wind_gust)))
+        else:
+            gust = ''
+        self.temperature_markup = '<span size="xx-large"><b>' + temp + deg + '</b></span> f/l ' + feels_like + deg
+        self.description_markup = '<span variant="smallcaps">' + escape(cc.description) + '</span>'
+        self.icon = cc.icon
+        self.wind = 'Wind: ' + wnd_spd + gust + ' ' + speed_unit + ' ' + units.bearing(cc.wind_deg)
+        self.pressure = 'Pressure: ' + str(cc.pressure) + ' mb'
+        self.humidity = 'Humidity: ' + str(cc.humidity) + '%'
+        self.sun = 'Sunrise: ' + cc.sunrise_time + '\n' + 'Sunset:  ' + cc.sunset_time
+        self.server_time = 'On server: ' + cc.server_time
+
+
+class DayView:
+    """ One day of the summary under the current conditions """
+
+    __slots__ = ('day', 'min_max', 'icon', 'tooltip_markup', 'wind', 'wind_dir', 'pop', 'rain', 'pressure')
+
+    def __init__(self, day, point, max_temp, min_temp, mean_wind, max_gust, max_pop, rain, mean_pres,
+                 temp_unit, speed_unit):
+        self.day = day
+        self.min_max = str(round(max_temp)) + '/' + str(round(min_temp)) + DEGREE + temp_unit
+        self.icon = point.icon
+        self.tooltip_markup = '<span variant="smallcaps">' + escape(point.description) + '</span>'
+        self.wind = str(round(mean_wind)) + '/' + str(round(max_gust)) + ' ' + speed_unit
+        self.wind_dir = units.bearing(point.wind_deg)
+        self.pop = str(round(max_pop * 100)) + '%'
+        self.rain = str(round(rain, 1)) + ' mm'
+        self.pressure = str(round(mean_pres)) + ' mb'
+
+
+def table_rows(points, temp_unit, speed_unit, palette):
+    """ Markup for each row of the five day table: time, temp, icon name, description,
+        rain, wind, wind dir, cloud, pressure, row background """
+    temps = units.temperature_column([point.temp for point in points], temp_unit)
+    temp_colours = palette.temp.column([point.temp for point in points])
+    speeds = units.speed_column([point.wind_speed for point in points], speed_unit)
+    wind_colours = palette.wind.column([point.wind_speed for point in points])
+    to_speed = units.speed_converter(speed_unit)
+    deg = DEGREE + temp_unit
+
+    rows = []
+    for i, point in enumerate(points):
+        prec = round(float(point.rain), 1)
+        if prec > 0:
+            rain = '<b>' + str(prec) + ' mm</b>'
+        else:
+            rain = str(prec) + ' mm'
+
+        if point.wind_gust is not None:
+            gust_colour = palette.wind(point.wind_gust)
+            wnd_gust = '/' + str(round(to_speed(point.wind_gust)))
+        else:
+            gust_colour = palette.wind.colours[0]
+            wnd_gust = ''
+
+        if point.is_day:
+            cloud = '<span background="' + palette.cloud(point.clouds) + '">' + str(point.clouds) + '%</span>'
+        else:
+            cloud = str(point.clouds) + '%'
+
+        rows.append((
+            '<b>' + point.day + ' ' + point.hour + 'h</b>',
+            '<b><span foreground="' + temp_colours[i] + '">' + str(round(temps[i], 1)) + deg + '</span></b>',
+            point.icon,
+            '<span variant="smallcaps">' + escape(point.description) + '</span>',
+            rain,
+            '<span foreground="' + wind_colours[i] + '">' + str(round(speeds[i])) + '</span><span foreground="'
+            + gust_colour + '">' + wnd_gust + speed_unit + '</span>',
+            units.bearing(point.wind_deg),
+            cloud,
+            str(point.pressure) + ' mb',
+            palette.row_background(point.is_day)))
+    return rows
+
+
+def table_tooltip(point, temp_unit):
+    """ Plain text details of a row of the five day table """
+    feels_like = str(round(units.temperature(point.feels_like, temp_unit), 1))
+    return (point.description + '\n' + 'Feels like ' + feels_like + DEGREE + temp_unit + '\n'
+            + 'Humidity ' + str(point.humidity) + '%\n' + 'Chance of rain ' + str(round(point.pop * 100)) + '%')
+
+
+def current(cc, temp_unit, speed_unit):
+    """ CurrentView of model.Current cc """
+    key = ('current', temp_unit, speed_unit)
+    view = cc.views.get(key)
+    if view is None:
+        view = cc.views[key] = CurrentView(cc, temp_unit, speed_unit)
+    return view
+
+
+def summary(forecast, temp_unit, speed_unit):
+    """ A DayView for each day of model.Forecast forecast """
+    key = ('summary', temp_unit, speed_unit)
+    view = forecast.views.get(key)
+    if view is None:
+        days = forecast.daily
+        max_temp = units.temperature_column(days.max_temp, temp_unit)
+        min_temp = units.temperature_column(days.min_temp, temp_unit)
+        mean_wind = units.speed_column(days.mean_wind, speed_unit)
+        max_gust = units.speed_column(days.max_gust, speed_unit)
+        view = forecast.views[key] = [
+            DayView(day, point, max_temp[i], min_temp[i], mean_wind[i], max_gust[i], days.max_pop[i], days.rain[i],
+                    days.mean_pres[i], temp_unit, speed_unit)
+            for i, (day, point) in enumerate(forecast.days)]
+    return view
+
+
+def table(forecast, temp_unit, speed_unit, palette=theme.DEFAULT):
+    """ table_rows for forecast's 3 hourly points """
+    key = ('table', temp_unit, speed_unit, palette)
+    view = forecast.views.get(key)
+    if view is None:
+        view = forecast.views[key] = table_rows(forecast.points, temp_unit, speed_unit, palette)
+    return view
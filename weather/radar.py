@@ -0,0 +1,185 @@
+# WeatherWidget (c) Don Atherton don@donatherton.co.uk
+""" Precipitation radar tiles around a place, for the widget to draw itself.
+
+The frames (times and where their tiles are) come from a RainViewer style
+weather-maps.json at WEATHER_WIDGET_RADAR, the map underneath from the slippy map
+tile URL template WEATHER_WIDGET_TILES. Point both at bench/stub_server.py to
+try it without the network.
+
+Tiles are kept in a TileCache, a size bounded directory of the PNGs as they came.
+A tile's URL names its frame time, so a cached tile never goes stale. Radar
+queues every tile the view needs, and one ring of neighbours, for every frame
+on a thread pool at once: those on screen now first, then the rest of the
+current frame, then the other frames newest first.
+"""
+
+import hashlib
+import math
+import os
+import threading
+import time
+
+from weather import trace
+
+FRAMES_URL = os.environ.get('WEATHER_WIDGET_RADAR', 'https://api.rainviewer.com/public/weather-maps.json')
+BASE_URL = os.environ.get('WEATHER_WIDGET_TILES', 'https://tile.openstreetmap.org/{z}/{x}/{y}.png')
+FRAME_TILES = '{host}{path}/256/{z}/{x}/{y}/2/1_1.png'  # colour scheme 2, smoothed, snow shown
+TILE = 256  # pixels
+ZOOM = 7
+FRAMES_TTL = 5 * 60  # seconds before the frame list is asked for again
+
+
+def tile_position(lat, lon, zoom):
+    """ Web Mercator position of lat, lon in tiles, fractional """
+    n = 2 ** zoom
+    lat = max(-85.0511, min(85.0511, lat))
+    x = (lon + 180) / 360 * n
+    y = (1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n
+    return x, y
+
+
+def view_tiles(lat, lon, zoom, width, height, margin=1):
+    """ Tiles for a width x height view centred on lat, lon, as (x, y, left, top, on
+        screen): the tile numbers and where its top left corner goes in the view.
+        margin more rings around the view are included, off screen. On screen
+        tiles come first, nearest the centre first """
+    x, y = tile_position(lat, lon, zoom)
+    origin_x = x * TILE - width / 2
+    origin_y = y * TILE - height / 2
+    first_x, last_x = math.floor(origin_x / TILE), math.floor((origin_x + width - 1) / TILE)
+    first_y, last_y = math.floor(origin_y / TILE), math.floor((origin_y + height - 1) / TILE)
+    n = 2 ** zoom
+    tiles = []
+    for ty in range(first_y - margin, last_y + margin + 1):
+        if not 0 <= ty < n:
+            continue
+        for tx in range(first_x - margin, last_x + margin + 1):
+            on_screen = first_x <= tx <= last_x and first_y <= ty <= last_y
+            distance = abs(tx + 0.5 - x) + abs(ty + 0.5 - y)
+            tiles.append((not on_screen, distance, tx % n, ty, tx * TILE - origin_x, ty * TILE - origin_y, on_screen))
+    tiles.sort()
+    return [tile[2:] for tile in tiles]
+
+
+def tile_url(template, zoom, x, y):
+    return template.format(z=zoom, x=x, y=y)
+
+
+class TileCache:
+    """ Map tiles on disk in directory, at most max_bytes of them. Reading a tile
+        touches it, the least recently used go first """
+
+    def __init__(self, directory, transport, max_bytes=32 * 1024 * 1024):
+        self.directory = directory
+        self.transport = transport
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.total = None  # bytes in the directory, counted on the first write
+
+    def path(self, url):
+        return os.path.join(self.directory, hashlib.sha1(url.encode()).hexdigest()[:20] + '.png')
+
+    def get(self, url, cancel=None):
+        """ The tile at url, from disk or downloaded. None if cancelled """
+        path = self.path(url)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+            return data
+        except OSError:
+            pass
+        response = self.transport.get(url, cancel=cancel)
+        if response is None:
+            return None
+        try:
+            self.write(path, response.body)
+        except OSError as e:  # a full or read-only disk only costs downloading it again
+            print(e)
+            self.total = None  # count again on the next write
+        return response.body
+
+    def write(self, path, data):
+        with self.lock:
+            os.makedirs(self.directory, exist_ok=True)
+            if self.total is None:
+                self.total = sum(entry.stat().st_size for entry in os.scandir(self.directory))
+            tmp = path + '.tmp'
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+            self.total += len(data)
+            if self.total > self.max_bytes:
+                self.evict()
+
+    def evict(self):
+        """ Remove least recently used tiles until the cache is 10% under max_bytes,
+            so it isn't done again on the next write """
+        entries = []
+        for entry in os.scandir(self.directory):
+            try:
+                st = entry.stat()
+            except FileNotFoundError:  # removed by another widget sharing the directory
+                continue
+            entries.append((st.st_mtime, st.st_size, entry.path))
+        for mtime, size, path in sorted(entries):
+            if self.total <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.total -= size
+
+
+class Radar:
+    """ The frame list and the tiles for a view, fetched through cache on pool """
+
+    def __init__(self, cache, pool, zoom=ZOOM):
+        self.cache = cache
+        self.pool = pool
+        self.zoom = zoom
+        self.frame_list = None  # (time fetched, frames)
+
+    def frames(self, cancel=None):
+        """ [(frame time, tile URL template)], oldest first: past radar, then nowcast """
+        if self.frame_list is not None and time.time() - self.frame_list[0] < FRAMES_TTL:
+            return self.frame_list[1]
+        maps = self.cache.transport.get_json(FRAMES_URL, cancel)
+        if maps is None:
+            return None
+        radar = maps['radar']
+        frames = [(frame['time'], FRAME_TILES.replace('{host}', maps['host']).replace('{path}', frame['path']))
+                  for frame in radar.get('past', []) + radar.get('nowcast', [])]
+        self.frame_list = (time.time(), frames)
+        return frames
+
+    def urls(self, frames, current, tiles):
+        """ (url, on screen) of the base map and every frame for tiles, in the order
+            they are wanted: what is on screen now, the rest of the current frame,
+            then the other frames newest first """
+        templates = [BASE_URL, frames[current][1]] + [frames[i][1] for i in reversed(range(len(frames))) if i != current]
+        wanted = [(tile_url(template, self.zoom, x, y), on_screen)
+                  for template in templates[:2] for x, y, left, top, on_screen in tiles]
+        wanted.sort(key=lambda url: not url[1])
+        wanted += [(tile_url(template, self.zoom, x, y), on_screen)
+                   for template in templates[2:] for x, y, left, top, on_screen in tiles]
+        return wanted
+
+    def prefetch(self, urls, cancel, done=None):
+        """ Queue downloads of urls, (url, on screen) pairs from self.urls, on the pool.
+            done(url, data) is called on the pool thread with each on screen tile as it
+            arrives, the rest are only brought into the cache """
+        return [self.pool.submit(self.fetch, url, cancel, done if on_screen else None) for url, on_screen in urls]
+
+    def fetch(self, url, cancel, done):
+        if cancel.is_set():
+            return
+        try:
+            with trace.span('tile'):
+                data = self.cache.get(url, cancel)
+        except Exception as e:
+            print(url, e)
+            return
+        if data is not None and done is not None and not cancel.is_set():
+            done(url, data)
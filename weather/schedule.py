@@ -0,0 +1,89 @@
+# WeatherWidget (c) Don Atherton don@donatherton.co.uk
+""" When to next ask for each endpoint.
+
+Current conditions are asked for every refresh period and the forecast, which
+OpenWeatherMap only remakes every 3 hours, every 3 hours. Both are timed from the
+server's own timestamps so a poll lands just after the upstream update, not at
+some arbitrary point between two. A poll that brings back the same data as the
+last one is retried a little later, and each time it comes back the same again
+the wait doubles, up to the period, so a station that reports less often than
+the period isn't polled much more than a fixed timer would. Failures back off
+exponentially with jitter.
+"""
+
+import random
+
+FORECAST_PERIOD = 3 * 60 * 60
+
+
+class Schedule:
+    """ Due time of one endpoint, in epoch seconds. period and the timestamps passed
+        to success are seconds; baseline is the period of a plain fixed timer, which
+        saved() compares against """
+
+    def __init__(self, period, baseline, started, margin=60, retry=None, max_backoff=60 * 60):
+        self.period = period
+        self.baseline = baseline
+        self.started = started
+        self.margin = margin  # after the upstream update, for it to reach the API
+        self.retry = retry  # how soon to look again if the data hadn't changed
+        self.max_backoff = max_backoff
+        self.server_time = None  # newest upstream timestamp seen
+        self.failures = 0
+        self.due = started
+        self.requests = 0
+        self.unchanged = 0
+        self.repeats = 0  # how far the retry after an unchanged poll has backed off
+
+    def fetched(self, count):
+        """ count requests were made """
+        self.requests += count
+
+    def success(self, server_time, now):
+        """ The fetch worked, server_time is the newest upstream timestamp it brought """
+        self.failures = 0
+        if self.server_time is not None and server_time <= self.server_time:
+            retry = self.retry or max(60, self.period // 5)
+            self.unchanged += 1
+            self.repeats = min(self.repeats + 1, (self.period // retry).bit_length() + 1)
+            self.due = now + min(self.period, retry * 2 ** (self.repeats - 1))
+            return
+        # Only one step back down, a station slower than the period would otherwise
+        # start from the short retry again after every update
+        self.repeats = max(0, self.repeats - 1)
+        self.server_time = server_time
+        self.align(now)
+
+    def align(self, now):
+        """ Due one period after the newest upstream update, moved on or back by whole
+            periods to be within the next period, to keep to the upstream's rhythm.
+            (The forecast's timestamp is its first slot, which can be in the future) """
+        due = self.server_time + self.period + self.margin
+        limit = now + self.period + self.margin
+        if due <= now:
+            due += ((now - due) // self.period + 1) * self.period
+        elif due > limit:
+            due -= -(-(due - limit) // self.period) * self.period
+        self.due = due
+
+    def set_period(self, period, baseline, now):
+        self.period = period
+        self.baseline = baseline
+        if self.server_time is not None and not self.failures:
+            self.align(now)
+
+    def failure(self, now):
+        """ The fetch failed, try again after a random delay that doubles each time """
+        self.failures += 1
+        delay = min(self.max_backoff, 60 * 2 ** (self.failures - 1))
+        self.due = now + delay / 2 + random.uniform(0, delay / 2)
+
+    def delay(self, now):
+        """ Whole seconds until due, at least 1 """
+        return max(1, int(self.due - now + 0.999))
+
+    def saved(self, now, places):
+        """ Requests a fixed timer of baseline seconds, for places places, would have
+            made since started, less the ones actually made. Negative if more were made """
+        would_have = (int((now - self.started) // self.baseline) + 1) * places
+        return would_have - self.requests
@@ -0,0 +1,51 @@
+# WeatherWidget (c) Don Atherton don@donatherton.co.uk
+""" The prefs file: one "name,value" pair per line """
+
+import os
+
+# The prefs file lives next to weather-widget.py
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'prefs')
+
+DEFAULTS = {
+    'appid': 'API key from https://home.openweathermap.org',
+    'lat': '51.5',
+    'lon': '0.0',
+    'loc': 'London',
+    'temp_unit': 'C',
+    'speed_unit': 'mph',
+    'timeout': '15',
+    'font_size': '12',
+    'x': '250',
+    'y': '10',
+    'locations': '',
+    'theme': 'custom.css'
+}
+
+ORDER = ('appid', 'lat', 'lon', 'loc', 'temp_unit', 'speed_unit', 'timeout', 'font_size', 'x', 'y', 'locations',
+         'theme')
+
+
+def read(path=DEFAULT_PATH):
+    """ prefs as a dict. Raises FileNotFoundError, or IndexError for a malformed line """
+    prefs_values = {}
+    with open(path, 'r') as file_object:
+        for line in file_object:
+            pref_value = line.split(',', 1)
+            prefs_values[pref_value[0]] = pref_value[1].strip()
+    return prefs_values
+
+
+def write(prefs_values, path=DEFAULT_PATH):
+    with open(path, 'w') as f:
+        f.write('\n'.join(name + ',' + str(prefs_values.get(name, DEFAULTS[name])) for name in ORDER))
+
+
+def places(prefs_values):
+    """ Every configured place as (name, lat, lon). The first is the main lat/lon/loc,
+        then any from locations, written as lat;lon;name|lat;lon;name... """
+    found = [(prefs_values['loc'], prefs_values['lat'], prefs_values['lon'])]
+    for place in prefs_values.get('locations', '').split('|'):
+        parts = place.split(';', 2)
+        if len(parts) == 3:
+            found.append((parts[2].strip(), parts[0].strip(), parts[1].strip()))
+    return found
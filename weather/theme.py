@@ -0,0 +1,72 @@
+# WeatherWidget (c) Don Atherton don@donatherton.co.uk
+""" Colours of the 5 day table and chart as theme data.
+
+Each colour scale is a list of band edges and one more colour than edges, looked
+up with bisect. A stylesheet can override any colour with @define-color, e.g.
+@define-color temp_band_0 #00ffff; the widget reads those names back when the
+CSS loads and compiles a new Palette.
+"""
+
+import math
+from array import array
+from bisect import bisect_right
+
+
+class Bands:
+    """ value -> colour. colours[i] covers values from edges[i - 1] up to, not
+        including, edges[i]. Values below the first edge get the first colour """
+
+    __slots__ = ('edges', 'colours')
+
+    def __init__(self, edges, colours):
+        if len(colours) != len(edges) + 1:
+            raise ValueError('need one more colour than edges')
+        self.edges = array('d', edges)
+        self.colours = tuple(colours)
+
+    def __call__(self, value):
+        return self.colours[bisect_right(self.edges, value)]
+
+    def column(self, values):
+        """ Colours for a whole column of values """
+        edges, colours = self.edges, self.colours
+        return [colours[bisect_right(edges, value)] for value in values]
+
+
+# name: (edges, default colours). Temperatures are Celsius, wind speeds m/s
+SCALES = {
+    'temp_band': ((math.nextafter(0.0, 1.0), 5, 10, 15, 20, 25),  # 0 itself is still the coldest band
+                  ('#00ffff', '#3399ff', '#3366cc', '#3319FF', '#ff3300', '#ff0000', '#993300')),
+    'cloud_band': ((20, 40, 60, 80), ('#eeeeee', '#dddddd', '#cccccc', '#bbbbbb', '#aaaaaa')),
+    'wind_band': ((8, 15, 20, 25), ('#2E423B', '#CE5C00', '#CE1600', '#CC0000', '#A40075')),
+}
+COLOURS = {'day_row': '#eeeeee', 'night_row': '#bbbbbb', 'table_text': '#191919',
+           'chart_rain': '#3399ff', 'chart_pop': '#3366cc'}
+
+
+def colour_names():
+    """ Every name a stylesheet can @define-color """
+    names = list(COLOURS)
+    for scale, (edges, colours) in SCALES.items():
+        names.extend(scale + '_' + str(i) for i in range(len(colours)))
+    return names
+
+
+class Palette:
+    """ Compiled colours: temp, cloud and wind Bands plus the plain COLOURS """
+
+    __slots__ = ('temp', 'cloud', 'wind', 'day_row', 'night_row', 'table_text', 'chart_rain', 'chart_pop')
+
+    def __init__(self, overrides=None):
+        overrides = overrides or {}
+        for scale, (edges, colours) in SCALES.items():
+            colours = [overrides.get(scale + '_' + str(i), colour) for i, colour in enumerate(colours)]
+            setattr(self, scale[:-len('_band')], Bands(edges, colours))
+        for name, colour in COLOURS.items():
+            setattr(self, name, overrides.get(name, colour))
+
+    def row_background(self, is_day):
+        return self.day_row if is_day else self.night_row
+
+
+DEFAULT = Palette()
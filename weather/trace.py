@@ -0,0 +1,93 @@
+# WeatherWidget (c) Don Atherton don@donatherton.co.uk
+""" Timed spans of the refresh, the five day window and preferences, saved as
+Chrome trace JSON for chrome://tracing or https://ui.perfetto.dev.
+
+Off unless WEATHER_WIDGET_TRACE names the file to write. When off span() hands
+back one shared do-nothing context manager, so the instrumented code pays for a
+function call and nothing else. The file is rewritten after each refresh and at
+exit, with the most recent MAX_EVENTS events.
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+
+PATH = os.environ.get('WEATHER_WIDGET_TRACE')
+MAX_EVENTS = 100000
+
+enabled = bool(PATH)
+events = deque(maxlen=MAX_EVENTS)
+threads = {}  # thread id -> name, for the metadata events
+lock = threading.Lock()
+NULL = nullcontext()
+
+
+def now():
+    """ Trace timestamp, microseconds """
+    return time.perf_counter_ns() // 1000
+
+
+def record(event):
+    tid = threading.get_ident()
+    if tid not in threads:
+        threads[tid] = threading.current_thread().name
+    event['pid'] = os.getpid()
+    event['tid'] = tid
+    events.append(event)
+
+
+class Span:
+    __slots__ = ('name', 'args', 'start')
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = now()
+        return self
+
+    def __exit__(self, *exc):
+        record({'name': self.name, 'ph': 'X', 'ts': self.start, 'dur': now() - self.start, 'args': self.args})
+        return False
+
+
+def span(name, **args):
+    """ with span('name', key=value): times the block as a complete event """
+    if not enabled:
+        return NULL
+    return Span(name, args)
+
+
+def begin(name, **args):
+    """ Start of a span that ends in another callback on the same thread, see end """
+    if enabled:
+        record({'name': name, 'ph': 'B', 'ts': now(), 'args': args})
+
+
+def end(name):
+    if enabled:
+        record({'name': name, 'ph': 'E', 'ts': now()})
+
+
+def write(path=None):
+    """ Save what has been recorded so far """
+    path = path or PATH
+    if not path:
+        return
+    with lock:
+        trace = [{'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': tid, 'args': {'name': name}}
+                 for tid, name in list(threads.items())]
+        trace.extend(list(events))
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms'}, f)
+        os.replace(tmp, path)
+
+
+if enabled:
+    atexit.register(write)
@@ -0,0 +1,169 @@
+# WeatherWidget (c) Don Atherton don@donatherton.co.uk
+""" Keep-alive HTTP client used for every download """
+
+import gzip
+import http.client
+import json
+import socket
+import threading
+import time
+import urllib.error
+import urllib.parse
+from collections import namedtuple
+
+from weather import trace
+
+Response = namedtuple('Response', 'url status headers body wire_bytes seconds')
+
+
+def traced_connection(address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None):
+    """ socket.create_connection with the DNS lookup and the TCP connect traced
+        apart. Whatever else the connect span holds is the TLS handshake """
+    host, port = address
+    with trace.span('dns', host=host):
+        infos = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+    error = OSError('no addresses for ' + host)
+    for family, kind, proto, canonname, sockaddr in infos:
+        try:
+            with trace.span('tcp connect', address=sockaddr[0]):
+                return socket.create_connection(sockaddr[:2], timeout, source_address)
+        except OSError as e:
+            error = e
+    raise error
+
+
+class Transport:
+    """ Small HTTP client used for every download. Connections are kept alive and
+        reused per host, bodies are requested gzipped and every request has connect
+        and read timeouts. Bytes received on the wire are counted per request """
+
+    user_agent = 'weather-widget (https://github.com/donatherton/weather-widget)'
+
+    def __init__(self, connect_timeout=5, read_timeout=20):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.idle = {}  # (scheme, host) -> idle connections ready for reuse
+        self.lock = threading.Lock()
+        self.wire_total = 0
+
+    def connection(self, scheme, host):
+        """ An idle kept-alive connection to host, or a new one. Returns (conn, reused) """
+        with self.lock:
+            idle = self.idle.get((scheme, host))
+            if idle:
+                return idle.pop(), True
+        return self.new_connection(scheme, host), False
+
+    def new_connection(self, scheme, host):
+        if scheme == 'https':
+            conn = http.client.HTTPSConnection(host, timeout=self.connect_timeout)
+        else:
+            conn = http.client.HTTPConnection(host, timeout=self.connect_timeout)
+        if trace.enabled:
+            conn._create_connection = traced_connection
+        return conn
+
+    def drop_idle(self, scheme, host):
+        """ Close every idle connection to host, e.g. once one of them turned out stale """
+        with self.lock:
+            conns = self.idle.pop((scheme, host), [])
+        for conn in conns:
+            conn.close()
+
+    def release(self, scheme, host, conn):
+        with self.lock:
+            self.idle.setdefault((scheme, host), []).append(conn)
+
+    def close(self):
+        with self.lock:
+            for conns in self.idle.values():
+                for conn in conns:
+                    conn.close()
+            self.idle = {}
+
+    def get(self, url, headers=None, cancel=None, redirects=3):
+        """ GET url. Returns a Response, or None if cancel was set while reading.
+            Raises urllib.error.HTTPError for error statuses """
+        parts = urllib.parse.urlsplit(url)
+        with trace.span('GET', host=parts.netloc, path=parts.path):  # no query, it holds the API key
+            return self.request(url, parts, headers, cancel, redirects)
+
+    def request(self, url, parts, headers, cancel, redirects):
+        """ get, inside its trace span """
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        request_headers = {'Accept-Encoding': 'gzip', 'User-Agent': self.user_agent}
+        if headers:
+            request_headers.update(headers)
+
+        start = time.monotonic()
+        conn, reused = self.connection(parts.scheme, parts.netloc)
+        try:
+            if conn.sock is None:
+                with trace.span('connect', reused=reused):
+                    conn.connect()
+            with trace.span('wait', reused=reused):  # request sent to response headers in
+                conn.request('GET', path, headers=request_headers)
+                conn.sock.settimeout(self.read_timeout)
+                response = conn.getresponse()
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            conn.close()
+            if not reused:
+                raise
+            # The server dropped the kept-alive connection. The others idle since then
+            # will have gone the same way, so try once on a brand new one
+            self.drop_idle(parts.scheme, parts.netloc)
+            conn = self.new_connection(parts.scheme, parts.netloc)
+            try:
+                conn.request('GET', path, headers=request_headers)
+                conn.sock.settimeout(self.read_timeout)
+                response = conn.getresponse()
+            except Exception:
+                conn.close()
+                raise
+        except Exception:
+            conn.close()
+            raise
+
+        chunks = []
+        try:
+            with trace.span('read'):
+                while cancel is None or not cancel.is_set():
+                    chunk = response.read(8192)
+                    if not chunk:
+                        break
+                    chunks.append(chunk)
+        except Exception:
+            conn.close()
+            raise
+        if cancel is not None and cancel.is_set():
+            conn.close()
+            return None
+        if response.will_close:
+            conn.close()
+        else:
+            self.release(parts.scheme, parts.netloc, conn)
+
+        body = b''.join(chunks)
+        wire_bytes = len(body) + len(str(response.msg)) + 16  # status line + headers + body
+        with self.lock:
+            self.wire_total += wire_bytes
+        if response.getheader('Content-Encoding', '') == 'gzip':
+            with trace.span('gunzip', bytes=len(body)):
+                body = gzip.decompress(body)
+
+        if response.status in (301, 302, 303, 307, 308) and redirects > 0:
+            location = urllib.parse.urljoin(url, response.getheader('Location'))
+            return self.get(location, headers, cancel, redirects - 1)
+        if response.status >= 400:
+            raise urllib.error.HTTPError(url, response.status, response.reason, response.msg, None)
+        return Response(url, response.status, response.msg, body, wire_bytes, time.monotonic() - start)
+
+    def get_json(self, url, cancel=None):
+        """ GET url and decode the JSON body """
+        response = self.get(url, cancel=cancel)
+        if response is None:
+            return None
+        with trace.span('json decode', bytes=len(response.body)):
+            return json.loads(response.body)
@@ -0,0 +1,79 @@
+# WeatherWidget (c) Don Atherton don@donatherton.co.uk
+""" Unit conversion. The API is always asked for metric values.
+
+Pick a converter once with temperature_converter or speed_converter and call it
+per value, or convert a whole forecast column with the *_column functions.
+"""
+
+from array import array
+from bisect import bisect_left
+
+TEMP_UNITS = ('C', 'F')
+SPEED_UNITS = ('kt', 'mph', 'm/s', 'kph', 'Bf')
+
+SPEED_FACTORS = {'m/s': 1.0, 'kph': 3.6, 'mph': 2.23694, 'kt': 1.944}  # from m/s
+
+# Compass points by the highest whole degree each covers, north twice as it wraps
+COMPASS = ('N', 'NNE', 'NE', 'ENE', 'E', 'ESE', 'SE', 'SSE', 'S', 'SSW', 'SW', 'WSW', 'W', 'WNW', 'NW', 'NNW', 'N')
+COMPASS_EDGES = (11, 33, 56, 78, 101, 123, 146, 168, 190, 213, 235, 258, 280, 303, 325, 347)
+BEARINGS = tuple(COMPASS[bisect_left(COMPASS_EDGES, deg)] for deg in range(361))  # the API sends whole degrees
+
+
+def beaufort(wndspd):
+    """ m/s to Beaufort """
+    return (float(wndspd) / 0.836) ** (2 / 3)
+
+
+def celsius(t):
+    return t
+
+
+def fahrenheit(t):
+    return (t * 1.8) + 32
+
+
+def speed_converter(unit):
+    """ Function taking m/s to unit """
+    if unit == 'Bf':
+        return beaufort
+    factor = SPEED_FACTORS.get(unit, 1.0)
+    return lambda wndspd: wndspd * factor
+
+
+def temperature_converter(unit):
+    """ Function taking Celsius to unit """
+    return fahrenheit if unit == 'F' else celsius
+
+
+def wind_speed(wndspd, unit):
+    """ m/s to unit """
+    return speed_converter(unit)(wndspd)
+
+
+def temperature(t, unit):
+    """ Celsius to unit """
+    return temperature_converter(unit)(t)
+
+
+def speed_column(values, unit):
+    """ A column of m/s values (e.g. aggregate.Columns.wind_speed) in unit, as an array """
+    return array('d', map(speed_converter(unit), values))
+
+
+def temperature_column(values, unit):
+    """ A column of Celsius values in unit, as an array """
+    if unit != 'F':
+        return array('d', values)
+    return array('d', [(t * 1.8) + 32 for t in values])
+
+
+def bearing(wnd_dir):
+    """ Compass point for a wind direction in degrees """
+    if type(wnd_dir) is int and 0 <= wnd_dir <= 360:
+        return BEARINGS[wnd_dir]
+    return COMPASS[bisect_left(COMPASS_EDGES, wnd_dir % 360 if wnd_dir > 360 else wnd_dir)]
+
+
+def bearing_column(values):
+    """ Compass points for a column of wind directions """
+    return [bearing(value) for value in values]